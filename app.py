@@ -1,5 +1,6 @@
 from configparser import ConfigParser
 from pathlib import Path
+import time
 from typing import Any
 from typing import Dict
 
@@ -8,56 +9,36 @@ import streamlit as st
 from dea import CONFIG
 from dea import DEFAULTS
 from dea import _DATA_DIR
-from dea import filter
+from dea import _STATIC_DIR
 from dea import io
+from dea import jobs
 from dea import plot
-from dea.mapselect import mapselect 
-from dea import retrofit
-import os
-
-
-import toml
-
-# Read values from the TOML file
-#config = toml.load("config.toml")
-
-
-import boto3
-import streamlit as st
-
-# Load AWS credentials from environment variables
-aws_access_key_id = os.environ.get("AWS_ACCESS_KEY_ID")
-aws_secret_access_key = os.environ.get("AWS_SECRET_ACCESS_KEY")
-
-
-# Access AWS credentials
-#aws_access_key_id = config["aws"]["access_key_id"]
-#aws_secret_access_key = config["aws"]["secret_access_key"]
-
-
-# Debugging print statements
-#print(f"AWS Access Key ID: {aws_access_key_id}")
-#print(f"AWS Secret Access Key: {aws_secret_access_key}")
-
-
+from dea import warmup
 
 DeaSelection = Dict[str, Any]
 
-@st.cache_data
-def load_small_area_boundaries(small_area_boundaries_url, data_dir):
-    return io.load_small_area_boundaries(
-        url=small_area_boundaries_url, data_dir=data_dir
-    )
+# streamlit runs this script once a session connects & again on every rerun,
+# so the warm up starts on the first run before anything is drawn & is only
+# started again if it failed, see `dea.warmup.start_warm_up`
+if st.runtime.exists():
+    warmup.start_warm_up(data_dir=_DATA_DIR, static_dir=_STATIC_DIR)
 
 def main(
     defaults: DeaSelection = DEFAULTS,
     data_dir: Path = _DATA_DIR,
     config: ConfigParser = CONFIG,
 ):
+    # bokeh, geopandas & shapely are slow to import so aren't imported with app
+    from dea.mapselect import mapselect
+
     st.header("Welcome to the Dublin Retrofitting Tool")
 
     small_area_boundaries_url = config["urls"]["small_area_boundaries"]
-    small_area_boundaries = load_small_area_boundaries(small_area_boundaries_url, data_dir)
+    small_area_map_layer = io.load_map_layer(
+        small_area_boundaries_url, data_dir=data_dir, static_dir=_STATIC_DIR
+    )
+    # a handle on the warm up started above, or a retry if it failed
+    warm_up = warmup.start_warm_up(data_dir=data_dir, static_dir=_STATIC_DIR)
 
 
     with st.form(key="Inputs"):
@@ -68,34 +49,55 @@ def main(
             default=["A", "B", "C", "D", "E", "F", "G"],
         )
         selected_small_areas = mapselect(
-            column_name="small_area", boundaries=small_area_boundaries
+            column_name="small_area",
+            map_layer=small_area_map_layer,
+            spatial_predicate="centroid",
         )
         retrofit_selections = _retrofitselect(defaults)
         inputs_are_submitted = st.form_submit_button(label="Submit")
 
     if inputs_are_submitted:
-        pre_retrofit = io.load_selected_buildings(
+        st.session_state["retrofit_job"] = io.submit_retrofit_summary(
             url=config["urls"]["bers"],
             data_dir=data_dir,
             selected_energy_ratings=selected_energy_ratings,
             selected_small_areas=selected_small_areas,
+            selections=retrofit_selections,
         )
 
-        with st.spinner("Retrofitting buildings..."):
-            post_retrofit = retrofit.retrofit_buildings(
-                buildings=pre_retrofit, selections=retrofit_selections
-            )
+    retrofit_job = st.session_state.get("retrofit_job")
+    if retrofit_job is not None:
+        _show_retrofit_job(retrofit_job)
 
-        pre_vs_post_bers = retrofit.calculate_ber_improvement(
-            pre_retrofit=pre_retrofit, post_retrofit=post_retrofit
-        )
-        pre_vs_post_hps = retrofit.calculate_heat_pump_viability_improvement(
-            pre_retrofit=pre_retrofit, post_retrofit=post_retrofit
+    if warm_up.done() and warm_up.exception() is not None:
+        st.warning(
+            f"Warming up failed with {warm_up.exception()!r} & is retried on the"
+            " next interaction, until then retrofits may be slow to start"
         )
 
-        plot.plot_ber_rating_comparison(pre_vs_post_bers)
-        plot.plot_heat_pump_viability_comparison(pre_vs_post_hps)
-        plot.plot_retrofit_costs(post_retrofit=post_retrofit)
+
+def _show_retrofit_job(job: jobs.Job, poll_seconds: float = 0.2) -> None:
+    # each summary is plotted as soon as it completes, polling doesn't block the
+    # session as streamlit interrupts it on the next interaction
+    plots = [
+        ("bers", plot.plot_ber_rating_comparison),
+        ("heat_pumps", plot.plot_heat_pump_viability_comparison),
+        ("costs", plot.plot_retrofit_costs),
+    ]
+    progress = st.empty()
+    while plots:
+        status = job.status()
+        while plots and plots[0][0] in status.results:
+            name, plot_summary = plots.pop(0)
+            plot_summary(status.results[name])
+        if status.done:
+            break
+        progress.progress(
+            status.fraction_complete, text=f"{status.stage.capitalize()}..."
+        )
+        time.sleep(poll_seconds)
+    progress.empty()
+    job.result()
 
 
 def _retrofitselect(defaults: DeaSelection) -> DeaSelection:
@@ -4,9 +4,27 @@ from pathlib import Path
 
 _SRC_DIR = Path(__file__).parent
 _DATA_DIR = Path(__file__).parent.parent / "data"
+_STATIC_DIR = Path(__file__).parent.parent / "static"
 
-CONFIG = ConfigParser()
-CONFIG.read(_SRC_DIR / "config.ini")
 
-with open(_SRC_DIR / "defaults.json") as f:
-    DEFAULTS = json.load(f)
+def _read_config() -> ConfigParser:
+    config = ConfigParser()
+    config.read(_SRC_DIR / "config.ini")
+    return config
+
+
+def _read_defaults() -> dict:
+    with open(_SRC_DIR / "defaults.json") as f:
+        return json.load(f)
+
+
+_LAZY_ATTRIBUTES = {"CONFIG": _read_config, "DEFAULTS": _read_defaults}
+
+
+def __getattr__(name: str):
+    # CONFIG & DEFAULTS are only read on first use so importing dea is cheap
+    if name in _LAZY_ATTRIBUTES:
+        value = _LAZY_ATTRIBUTES[name]()
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,3 @@
+from dea.main import main
+
+main()
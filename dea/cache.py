@@ -0,0 +1,213 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+import functools
+import os
+from pathlib import Path
+import shutil
+import tempfile
+from threading import Lock
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Tuple
+import uuid
+
+import pandas as pd
+
+
+def _memoize(func: Callable) -> Callable:
+    memoized = functools.lru_cache(maxsize=None)(func)
+    # mirror the streamlit cache decorators
+    memoized.clear = memoized.cache_clear
+    return memoized
+
+
+def _cache_lazily(decorator_name: str) -> Callable[[Callable], Callable]:
+    # streamlit takes a noticeable time to import so it is only imported on the
+    # first call of a decorated function, & if installed, see the app extra
+    def decorator(func: Callable) -> Callable:
+        cached_func = None
+        lock = Lock()
+
+        def get_cached_func() -> Callable:
+            nonlocal cached_func
+            with lock:
+                if cached_func is None:
+                    try:
+                        import streamlit as st
+                    except ImportError:
+                        cached_func = _memoize(func)
+                    else:
+                        cached_func = getattr(st, decorator_name)(func)
+            return cached_func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_cached_func()(*args, **kwargs)
+
+        wrapper.clear = lambda: get_cached_func().clear()
+        return wrapper
+
+    return decorator
+
+
+cache_data = _cache_lazily("cache_data")
+cache_resource = _cache_lazily("cache_resource")
+
+
+@dataclass(frozen=True)
+class CacheInfo:
+    """Counters & size of a cache.
+
+    Attributes:
+        hits (int): Lookups found in the cache
+        misses (int): Lookups not found in the cache
+        evictions (int): Entries dropped to stay within the memory budget
+        entries (int): Entries currently held
+        nbytes (int): Memory currently held
+        max_bytes (int): Memory budget
+    """
+
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    nbytes: int
+    max_bytes: int
+
+
+def get_nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+class LRUCache:
+    """A thread-safe least recently used cache bounded by memory not entries.
+
+    Entries are shared by every caller & so must be treated as read-only.
+
+    Args:
+        max_bytes (int): Memory budget, the least recently used entries are
+            evicted once it is exceeded
+        get_size (Callable[[object], int], optional): Memory held by a value.
+            Defaults to get_nbytes.
+    """
+
+    def __init__(self, max_bytes: int, get_size: Callable[[object], int] = get_nbytes):
+        self.max_bytes = max_bytes
+        self._get_size = get_size
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: Hashable) -> Optional[object]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return self._entries[key][0]
+            self._misses += 1
+            return None
+
+    def put(self, key: Hashable, value: object) -> None:
+        nbytes = self._get_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._nbytes -= self._entries.pop(key)[1]
+            # a value larger than the whole budget would evict everything
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self._nbytes += nbytes
+            while self._nbytes > self.max_bytes:
+                _, (_, evicted_nbytes) = self._entries.popitem(last=False)
+                self._nbytes -= evicted_nbytes
+                self._evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nbytes = 0
+
+    def cache_info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                entries=len(self._entries),
+                nbytes=self._nbytes,
+                max_bytes=self.max_bytes,
+            )
+
+
+class DiskCache:
+    """A cache of named DataFrames on local disk bounded by size.
+
+    Each entry is a directory of Arrow IPC files, written to a temporary
+    directory & renamed into place so concurrent readers & writers, even across
+    processes, never see a partial entry. Entries are evicted least recently
+    used first, by modification time, once the cache exceeds max_bytes.
+
+    Args:
+        cache_dir (Path): Directory holding the entries
+        max_bytes (int): Size budget of all entries
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+
+    def get(self, key: str) -> Optional[Dict[str, pd.DataFrame]]:
+        entry_dir = self.cache_dir / key
+        try:
+            frames = {
+                path.stem: pd.read_feather(path)
+                for path in sorted(entry_dir.glob("*.feather"))
+            }
+            os.utime(entry_dir)
+        except FileNotFoundError:  # evicted while being read
+            return None
+        return frames or None
+
+    def put(self, key: str, frames: Dict[str, pd.DataFrame]) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        temporary_dir = Path(tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir))
+        for name, frame in frames.items():
+            frame.to_feather(temporary_dir / f"{name}.feather")
+        try:
+            os.rename(temporary_dir, self.cache_dir / key)
+        except OSError:  # another writer got there first
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+        self._evict()
+
+    def _get_entries(self) -> List[Tuple[float, int, Path]]:
+        entries = []
+        for entry_dir in self.cache_dir.iterdir():
+            if entry_dir.name.startswith("."):
+                continue
+            try:
+                nbytes = sum(path.stat().st_size for path in entry_dir.iterdir())
+                entries.append((entry_dir.stat().st_mtime, nbytes, entry_dir))
+            except FileNotFoundError:  # evicted by another process
+                continue
+        return sorted(entries)
+
+    def _evict(self) -> None:
+        entries = self._get_entries()
+        nbytes = sum(entry_nbytes for _, entry_nbytes, _ in entries)
+        for _, entry_nbytes, entry_dir in entries:
+            if nbytes <= self.max_bytes:
+                break
+            # renamed first so readers never see an entry half deleted
+            evicted_dir = self.cache_dir / f".evicted-{uuid.uuid4().hex}"
+            try:
+                os.rename(entry_dir, evicted_dir)
+            except OSError:
+                continue
+            shutil.rmtree(evicted_dir, ignore_errors=True)
+            nbytes -= entry_nbytes
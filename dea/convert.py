@@ -0,0 +1,281 @@
+import argparse
+import hashlib
+import json
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as csv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from dea import schema
+
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 2
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+DROP_OPTIONS = ["row", "column", None]
+DOWNCAST_TYPES = schema.get_arrow_types()
+
+
+def _read_csv_in_batches(
+    input_file_path: Path,
+    block_size: int,
+    column_types: Dict[str, pa.DataType],
+    include_columns: Optional[List[str]] = None,
+) -> Iterator[pa.RecordBatch]:
+    # every column must be declared in column_types, see _get_column_types, as a
+    # type inferred from the first block is enforced on the rest
+    reader = csv.open_csv(
+        input_file_path,
+        read_options=csv.ReadOptions(block_size=block_size),
+        convert_options=csv.ConvertOptions(
+            column_types=column_types,
+            include_columns=include_columns,
+            strings_can_be_null=True,
+        ),
+    )
+    yield from reader
+
+
+def _get_column_types(
+    input_file_path: Path, block_size: int, column_types: Dict[str, pa.DataType]
+) -> Dict[str, pa.DataType]:
+    # a sparse CSV can leave a column empty in the first block & filled later, so
+    # columns without a declared type are read as strings rather than inferred
+    reader = csv.open_csv(
+        input_file_path,
+        read_options=csv.ReadOptions(block_size=block_size),
+        convert_options=csv.ConvertOptions(column_types=column_types),
+    )
+    return {name: column_types.get(name, pa.string()) for name in reader.schema.names}
+
+
+def _get_columns_without_nulls(
+    input_file_path: Path, block_size: int, column_types: Dict[str, pa.DataType]
+) -> List[str]:
+    null_counts: Dict[str, int] = {}
+    for batch in _read_csv_in_batches(input_file_path, block_size, column_types):
+        for name, column in zip(batch.schema.names, batch.columns):
+            null_counts[name] = null_counts.get(name, 0) + column.null_count
+    return [name for name, null_count in null_counts.items() if null_count == 0]
+
+
+def convert_csv_to_parquet(
+    input_file_path: Path,
+    output_file_path: Path,
+    drop_option: Optional[str] = None,
+    block_size: int = 16 * 2 ** 20,
+    column_types: Optional[Dict[str, pa.DataType]] = None,
+) -> int:
+    """Stream a CSV of buildings into parquet without reading it all into memory.
+
+    The CSV is read & written one block at a time, each block becoming a parquet
+    row group, so memory use is bounded by block_size rather than file size.
+
+    Args:
+        input_file_path (Path): CSV file of buildings
+        output_file_path (Path): Parquet file to write
+        drop_option (Optional[str], optional): Drop each 'row' containing an empty
+            field, drop each 'column' containing an empty field (this reads the CSV
+            twice) or None to keep everything. Defaults to None.
+        block_size (int, optional): Bytes of CSV read per batch.
+            Defaults to 16 MiB.
+        column_types (Optional[Dict[str, pa.DataType]], optional): Column types,
+            columns not given a type are stored as strings. Defaults to
+            DOWNCAST_TYPES.
+
+    Returns:
+        int: Number of rows written
+    """
+    if drop_option not in DROP_OPTIONS:
+        raise ValueError(f"drop_option must be one of {DROP_OPTIONS}")
+    column_types = _get_column_types(
+        input_file_path,
+        block_size=block_size,
+        column_types=DOWNCAST_TYPES if column_types is None else column_types,
+    )
+
+    if drop_option == "column":
+        include_columns = _get_columns_without_nulls(
+            input_file_path, block_size=block_size, column_types=column_types
+        )
+    else:
+        include_columns = list(column_types)
+    output_schema = pa.schema([(name, column_types[name]) for name in include_columns])
+
+    batches = _read_csv_in_batches(
+        input_file_path,
+        block_size=block_size,
+        column_types=column_types,
+        include_columns=include_columns,
+    )
+    num_rows = 0
+    writer = None
+    try:
+        for batch in batches:
+            table = pa.Table.from_batches([batch]).cast(output_schema)
+            if drop_option == "row":
+                table = table.drop_null()
+            if writer is None:
+                writer = pq.ParquetWriter(output_file_path, output_schema)
+            writer.write_table(table)
+            num_rows += table.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return num_rows
+
+
+def _hash_file(filepath: Path, chunk_size: int = 2 ** 20) -> str:
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_file_version(filepath: Path) -> str:
+    """Version a file by its size & modification time without reading it."""
+    stat = Path(filepath).stat()
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+def _get_partition_filter(energy_rating: Optional[str]) -> ds.Expression:
+    if energy_rating is None:
+        return ds.field("energy_rating").is_null()
+    else:
+        return ds.field("energy_rating") == energy_rating
+
+
+def _write_partition(
+    source: ds.Dataset,
+    output_dir: Path,
+    energy_rating: Optional[str],
+    row_group_size: int,
+) -> Dict[str, Any]:
+    partition = source.to_table(filter=_get_partition_filter(energy_rating))
+    partition = partition.drop(["energy_rating"]).sort_by("small_area")
+    partition_name = NULL_PARTITION if energy_rating is None else energy_rating
+    relative_path = Path(f"energy_rating={partition_name}") / "part-0.parquet"
+    filepath = output_dir / relative_path
+    filepath.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(partition, filepath, row_group_size=row_group_size)
+
+    small_areas = pc.min_max(partition["small_area"])
+    return {
+        "path": relative_path.as_posix(),
+        "energy_rating": energy_rating,
+        "num_rows": partition.num_rows,
+        "small_area_min": small_areas["min"].as_py(),
+        "small_area_max": small_areas["max"].as_py(),
+    }
+
+
+def convert_parquet_to_dataset(
+    input_file_path: Path, output_dir: Path, row_group_size: int = 10_000
+) -> Dict[str, Any]:
+    """Write buildings to a dataset partitioned by energy rating.
+
+    Each partition is sorted by small area & split into row groups so parquet
+    statistics let readers skip the row groups of unselected small areas.
+    Partitions are written one at a time so only one is held in memory.
+
+    Args:
+        input_file_path (Path): Parquet file of buildings
+        output_dir (Path): Directory in which the dataset is written
+        row_group_size (int, optional): Rows per parquet row group.
+            Defaults to 10_000.
+
+    Returns:
+        Dict[str, Any]: Manifest of the dataset, also saved to output_dir
+    """
+    input_file_path = Path(input_file_path)
+    output_dir = Path(output_dir)
+    source = ds.dataset(input_file_path, format="parquet")
+    energy_ratings = pc.unique(
+        source.to_table(columns=["energy_rating"])["energy_rating"]
+    )
+    partitions = [
+        _write_partition(
+            source,
+            output_dir=output_dir,
+            energy_rating=energy_rating,
+            row_group_size=row_group_size,
+        )
+        for energy_rating in sorted(
+            energy_ratings.to_pylist(), key=lambda rating: (rating is None, rating)
+        )
+    ]
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "source": input_file_path.name,
+        "dataset_version": _hash_file(input_file_path),
+        "source_version": get_file_version(input_file_path),
+        "partitioning": ["energy_rating"],
+        "sorting": ["small_area"],
+        "num_rows": sum(p["num_rows"] for p in partitions),
+        "partitions": partitions,
+    }
+    with open(output_dir / MANIFEST_FILENAME, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def read_manifest(dataset_dir: Path) -> Dict[str, Any]:
+    with open(Path(dataset_dir) / MANIFEST_FILENAME) as f:
+        return json.load(f)
+
+
+def is_dataset_current(input_file_path: Path, dataset_dir: Path) -> bool:
+    """Check a dataset was written from the current version of its source.
+
+    Args:
+        input_file_path (Path): Parquet file of buildings
+        dataset_dir (Path): Directory containing the dataset & its manifest
+
+    Returns:
+        bool: Whether the dataset holds the same buildings as its source
+    """
+    if not (Path(dataset_dir) / MANIFEST_FILENAME).exists():
+        return False
+    manifest = read_manifest(dataset_dir)
+    return manifest.get("version") == MANIFEST_VERSION and manifest.get(
+        "source_version"
+    ) == get_file_version(input_file_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the buildings dataset")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    csv_parser = subparsers.add_parser("csv", help="Stream a CSV into parquet")
+    csv_parser.add_argument("input_file_path", type=Path)
+    csv_parser.add_argument("output_file_path", type=Path)
+    csv_parser.add_argument("--drop", choices=["row", "column"], default=None)
+    csv_parser.add_argument("--block-size", type=int, default=16 * 2 ** 20)
+
+    dataset_parser = subparsers.add_parser(
+        "dataset", help="Partition a parquet by energy rating"
+    )
+    dataset_parser.add_argument("input_file_path", type=Path)
+    dataset_parser.add_argument("output_dir", type=Path)
+    dataset_parser.add_argument("--row-group-size", type=int, default=10_000)
+
+    args = parser.parse_args()
+    if args.command == "csv":
+        convert_csv_to_parquet(
+            args.input_file_path,
+            args.output_file_path,
+            drop_option=args.drop,
+            block_size=args.block_size,
+        )
+    else:
+        convert_parquet_to_dataset(
+            args.input_file_path, args.output_dir, row_group_size=args.row_group_size
+        )
@@ -1,54 +1,178 @@
-from typing import Any
-from typing import Dict
 from typing import List
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 
+ENERGY_RATINGS = ["A", "B", "C", "D", "E", "F", "G"]
+BER_RATINGS = [
+    "A1",
+    "A2",
+    "A3",
+    "B1",
+    "B2",
+    "B3",
+    "C1",
+    "C2",
+    "C3",
+    "D1",
+    "D2",
+    "E1",
+    "E2",
+    "F",
+    "G",
+]
 
-def _filter_by_substrings(
-    df: pd.DataFrame,
-    column_name: str,
-    selected_substrings: List[str],
-    all_substrings: List[str],
-) -> pd.DataFrame:
-    if len(selected_substrings) == len(all_substrings):
-        selected_df = df
+
+def expand_energy_ratings(selected_energy_ratings: List[str]) -> List[str]:
+    """Expand energy rating bands (A, B, ...) into the BER ratings they contain.
+
+    Args:
+        selected_energy_ratings (List[str]): Energy rating bands such as ["A", "G"]
+
+    Returns:
+        List[str]: BER ratings such as ["A1", "A2", "A3", "G"]
+    """
+    return [
+        rating
+        for rating in BER_RATINGS
+        if any(rating.startswith(band) for band in selected_energy_ratings)
+    ]
+
+
+def index_by_small_area(buildings: pd.DataFrame) -> pd.DataFrame:
+    """Sort buildings by small area with small area & energy rating as categoricals.
+
+    Each small area then occupies one contiguous block of rows, see
+    `get_small_area_offsets`.
+
+    Args:
+        buildings (pd.DataFrame): Buildings with small_area & energy_rating columns
+
+    Returns:
+        pd.DataFrame: Buildings sorted by small area
+    """
+    return (
+        buildings.astype({"small_area": "category", "energy_rating": "category"})
+        .sort_values("small_area", kind="stable", na_position="first")
+        .reset_index(drop=True)
+    )
+
+
+def get_small_area_offsets(small_areas: pd.Series) -> np.ndarray:
+    """Map each small area category code to its block of rows.
+
+    Args:
+        small_areas (pd.Series): Categorical small areas sorted as in
+            `index_by_small_area`
+
+    Returns:
+        np.ndarray: Small area with code i occupies rows offsets[i]:offsets[i + 1]
+    """
+    codes = small_areas.cat.codes.to_numpy()
+    return np.searchsorted(codes, np.arange(len(small_areas.cat.categories) + 1))
+
+
+def _as_categorical(values: pd.Series) -> pd.Series:
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    else:
+        return values.astype("category")
+
+
+def _get_selected_codes(values: pd.Series, selected_values: List[str]) -> np.ndarray:
+    # an extra False is appended so missing values (code -1) are never selected
+    return np.append(values.cat.categories.isin(selected_values), False)
+
+
+def _get_rows_in_blocks(
+    offsets: np.ndarray, is_selected_code: np.ndarray
+) -> np.ndarray:
+    codes = np.flatnonzero(is_selected_code[:-1])
+    starts = offsets[codes]
+    lengths = offsets[codes + 1] - starts
+    block_starts = np.cumsum(lengths) - lengths
+    return np.repeat(starts - block_starts, lengths) + np.arange(lengths.sum())
+
+
+def _get_rows_by_small_area(
+    small_areas: pd.Series,
+    selected_small_areas: Optional[List[str]],
+    small_area_offsets: Optional[np.ndarray],
+) -> Optional[np.ndarray]:
+    if selected_small_areas is None:
+        return None
+    small_areas = _as_categorical(small_areas)
+    is_selected_code = _get_selected_codes(small_areas, selected_small_areas)
+    if small_area_offsets is not None:
+        has_missing_small_areas = small_area_offsets[0] > 0
+    else:
+        has_missing_small_areas = small_areas.isna().any()
+
+    if is_selected_code[:-1].all() and not has_missing_small_areas:
+        rows = None
+    elif small_area_offsets is not None:
+        rows = _get_rows_in_blocks(small_area_offsets, is_selected_code)
     else:
-        substrings_to_search = "|".join(selected_substrings)
-        selected_df = df[
-            df[column_name].str.title().str.contains(substrings_to_search, regex=True)
-        ]
-    return selected_df
+        rows = np.flatnonzero(is_selected_code[small_areas.cat.codes.to_numpy()])
+    return rows
 
 
 def get_selected_buildings(
     buildings: pd.DataFrame,
     selected_energy_ratings: List[str],
-    selected_small_areas: List[str],
+    selected_small_areas: Optional[List[str]],
+    small_area_offsets: Optional[np.ndarray] = None,
 ) -> pd.DataFrame:
-    filtered_buildings = (
-        buildings.pipe(
-            _filter_by_substrings,
-            column_name="energy_rating",
-            selected_substrings=selected_energy_ratings,
-            all_substrings=["A", "B", "C", "D", "E", "F", "G"],
-        )
-        .pipe(
-            _filter_by_substrings,
-            column_name="small_area",
-            selected_substrings=selected_small_areas,
-            all_substrings=buildings["small_area"],
-        )
-        .reset_index(drop=True)
+    """Select buildings by exact match on their energy rating & small area.
+
+    Args:
+        buildings (pd.DataFrame): Buildings with small_area & energy_rating columns
+        selected_energy_ratings (List[str]): Energy rating bands such as ["A", "G"]
+        selected_small_areas (Optional[List[str]]): Small area codes, None
+            selects every small area
+        small_area_offsets (Optional[np.ndarray], optional): Row blocks of each
+            small area for buildings sorted by `index_by_small_area`, if provided
+            selection only touches the rows of the selected small areas.
+            Defaults to None.
+
+    Raises:
+        ValueError: If no buildings meet the selection
+
+    Returns:
+        pd.DataFrame: Selected buildings
+    """
+    rows = _get_rows_by_small_area(
+        small_areas=buildings["small_area"],
+        selected_small_areas=selected_small_areas,
+        small_area_offsets=small_area_offsets,
     )
+    energy_ratings = _as_categorical(buildings["energy_rating"])
+    if set(selected_energy_ratings) != set(ENERGY_RATINGS):
+        is_selected_code = _get_selected_codes(
+            energy_ratings, expand_energy_ratings(selected_energy_ratings)
+        )
+        codes = energy_ratings.cat.codes.to_numpy()
+        if rows is None:
+            rows = np.flatnonzero(is_selected_code[codes])
+        else:
+            rows = rows[is_selected_code[codes[rows]]]
+
+    if rows is None:
+        # a shallow copy shares the columns of the stock rather than copying them
+        filtered_buildings = buildings.copy(deep=False)
+        filtered_buildings.index = pd.RangeIndex(len(buildings))
+    else:
+        filtered_buildings = buildings.take(rows).reset_index(drop=True)
+
     if filtered_buildings.empty:
         raise ValueError(
             f"""
             There are no buildings meeting your criteria:
 
-            energy_rating: {selections["energy_rating"]}
+            energy_rating: {selected_energy_ratings}
 
-            small_area: {selections["small_area"]}
+            small_area: {selected_small_areas}
             """
         )
     else:
@@ -1,37 +1,238 @@
+from copy import deepcopy
+from dataclasses import replace
+from functools import lru_cache
+from functools import partial
+import hashlib
+import json
 from pathlib import Path
+from typing import Any
 from typing import Callable
+from typing import Dict
 from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TYPE_CHECKING
 
-import fsspec
-import geopandas as gpd
+import numpy as np
 import pandas as pd
-import streamlit as st
+import pyarrow as pa
+import pyarrow.dataset as ds
 
+from dea import cache
+from dea import convert
 from dea import filter
+from dea import jobs
 from dea import retrofit
+from dea import schema
+
+# geopandas & shapely are slow to import & only needed by the map
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+    from dea import maplayer
 
 
 def _load(read: Callable, url: str, data_dir: Path, filesystem_name: str, **kwargs):
     filename = url.split("/")[-1]
     filepath = data_dir / filename
     if not filepath.exists():
+        import fsspec
+
         fs = fsspec.filesystem(filesystem_name)
         with fs.open(url, cache_storage=filepath) as f:
             df = read(f, **kwargs)
     else:
-        df = read(filepath)
+        df = read(filepath, **kwargs)
     return df
 
 
-@st.cache_data
-def load_small_area_boundaries(url: str, data_dir: Path) -> gpd.GeoDataFrame:
+@lru_cache(maxsize=None)
+def get_selected_buildings_cache() -> cache.LRUCache:
+    """Create the cache of selections on first use so importing reads no config.
+
+    Selections are shared by every session so must be treated as read-only.
+    """
+    from dea import CONFIG
+
+    return cache.LRUCache(
+        max_bytes=CONFIG.getint("cache", "selected_buildings_max_mb", fallback=512)
+        * 2**20
+    )
+
+
+# bump when summaries change so results cached on disk are not reused
+RETROFIT_SUMMARY_VERSION = 1
+
+
+def _fetch(url: str, data_dir: Path, filesystem_name: str) -> Path:
+    filepath = data_dir / url.split("/")[-1]
+    if not filepath.exists():
+        import fsspec
+
+        fs = fsspec.filesystem(filesystem_name)
+        fs.get(url, str(filepath))
+    return filepath
+
+
+@cache.cache_data
+def load_small_area_boundaries(url: str, data_dir: Path) -> "gpd.GeoDataFrame":
+    import geopandas as gpd
+
     return _load(
         read=gpd.read_file, url=url, data_dir=data_dir, filesystem_name="s3", driver="GPKG"
     )
 
 
-def _load_buildings(url: str, data_dir: Path):
-    return _load(read=pd.read_parquet, url=url, data_dir=data_dir, filesystem_name="s3")
+@cache.cache_resource
+def load_map_layer(
+    url: str, data_dir: Path, static_dir: Path, epsg: str = "3857"
+) -> "maplayer.MapLayer":
+    """Load the map layer of the small area boundaries once per process.
+
+    The layer is read from static_dir if it was built from the same boundaries
+    file & parameters, otherwise it is rebuilt & saved, see
+    `dea.maplayer.convert_boundaries_to_map_layer`. Its tiles are served by
+    streamlit from static_dir, see .streamlit/config.toml.
+
+    Args:
+        url (str): URL of the small area boundaries
+        data_dir (Path): Directory in which downloads are cached
+        static_dir (Path): Directory served by streamlit as app/static
+        epsg (str, optional): EPSG registry. Defaults to "3857".
+
+    Returns:
+        maplayer.MapLayer: Boundaries prepared for mapping
+    """
+    from dea import maplayer
+
+    boundaries_file_path = _fetch(url, data_dir=data_dir, filesystem_name="s3")
+    map_layer_dir = static_dir / f"{boundaries_file_path.stem}_map_layer"
+    if maplayer.is_map_layer_current(boundaries_file_path, map_layer_dir, epsg=epsg):
+        map_layer = maplayer.read_map_layer(map_layer_dir)
+    else:
+        map_layer = maplayer.convert_boundaries_to_map_layer(
+            boundaries_file_path, map_layer_dir, epsg=epsg
+        )
+    tiles_url = f"/app/static/{map_layer_dir.name}/{maplayer.TILES_DIRNAME}"
+    return replace(map_layer, tiles={}, tiles_url=tiles_url)
+
+
+def _get_parquet_filters(
+    selected_energy_ratings: List[str], selected_small_areas: List[str]
+) -> Optional[List[Tuple[str, str, List[str]]]]:
+    filters = []
+    if set(selected_energy_ratings) != set(filter.ENERGY_RATINGS):
+        filters.append(
+            (
+                "energy_rating",
+                "in",
+                filter.expand_energy_ratings(selected_energy_ratings),
+            )
+        )
+    if selected_small_areas is not None:
+        filters.append(("small_area", "in", list(selected_small_areas)))
+    return filters if filters else None
+
+
+def _load_buildings(
+    url: str,
+    data_dir: Path,
+    columns: Optional[List[str]] = None,
+    filters: Optional[List[Tuple[str, str, List[str]]]] = None,
+) -> pd.DataFrame:
+    categorical_columns = [
+        c for c in schema.get_categorical_columns() if columns is None or c in columns
+    ]
+    buildings = _load(
+        read=pd.read_parquet,
+        url=url,
+        data_dir=data_dir,
+        filesystem_name="s3",
+        columns=columns,
+        filters=filters,
+        read_dictionary=categorical_columns,
+    )
+    return schema.apply_schema(buildings)
+
+
+def _get_dataset_dir(url: str, data_dir: Path) -> Path:
+    return data_dir / Path(url.split("/")[-1]).stem
+
+
+def _get_selected_partitions(
+    manifest: Dict[str, Any],
+    selected_energy_ratings: List[str],
+    selected_small_areas: List[str],
+) -> List[Dict[str, Any]]:
+    partitions = manifest["partitions"]
+    if set(selected_energy_ratings) != set(filter.ENERGY_RATINGS):
+        ratings = filter.expand_energy_ratings(selected_energy_ratings)
+        partitions = [p for p in partitions if p["energy_rating"] in ratings]
+    if selected_small_areas is not None:
+        small_areas = sorted(selected_small_areas)
+        partitions = [
+            p
+            for p in partitions
+            if p["num_rows"] > 0
+            and p["small_area_min"] is not None
+            and np.searchsorted(small_areas, p["small_area_min"])
+            < np.searchsorted(small_areas, p["small_area_max"], side="right")
+        ]
+    return partitions
+
+
+def _open_partitions(dataset_dir: Path, partitions: List[Dict[str, Any]]) -> ds.Dataset:
+    return ds.dataset(
+        [str(dataset_dir / p["path"]) for p in partitions],
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("energy_rating", pa.string())]), flavor="hive"
+        ),
+        partition_base_dir=str(dataset_dir),
+    )
+
+
+def read_buildings_dataset(
+    dataset_dir: Path,
+    selected_energy_ratings: List[str],
+    selected_small_areas: List[str],
+    columns: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """Read the selected buildings from a dataset partitioned by energy rating.
+
+    Only partitions holding a selected energy rating & spanning a selected small
+    area are opened, within them parquet statistics skip unselected row groups.
+    See `dea.convert.convert_parquet_to_dataset`.
+
+    Args:
+        dataset_dir (Path): Directory containing the dataset & its manifest
+        selected_energy_ratings (List[str]): Energy rating bands such as ["A", "G"]
+        selected_small_areas (List[str]): Small area codes
+        columns (Optional[List[str]], optional): Columns to read. Defaults to None.
+
+    Returns:
+        pd.DataFrame: Selected buildings
+    """
+    manifest = convert.read_manifest(dataset_dir)
+    partitions = _get_selected_partitions(
+        manifest,
+        selected_energy_ratings=selected_energy_ratings,
+        selected_small_areas=selected_small_areas,
+    )
+    if not partitions:
+        dataset = _open_partitions(dataset_dir, manifest["partitions"])
+        empty_table = dataset.schema.empty_table()
+        if columns is not None:
+            empty_table = empty_table.select(columns)
+        return schema.apply_schema(empty_table.to_pandas())
+
+    dataset = _open_partitions(dataset_dir, partitions)
+    if selected_small_areas is not None:
+        small_area_filter = ds.field("small_area").isin(list(selected_small_areas))
+    else:
+        small_area_filter = None
+    buildings = dataset.to_table(columns=columns, filter=small_area_filter).to_pandas()
+    return schema.apply_schema(buildings)
 
 
 def _add_retrofit_columns(buildings: pd.DataFrame) -> pd.DataFrame:
@@ -41,20 +242,293 @@ def _add_retrofit_columns(buildings: pd.DataFrame) -> pd.DataFrame:
         + buildings["second_floor_area"]
         + buildings["third_floor_area"]
     )
-    return retrofit.calculate_fabric_heat_loss(buildings)
+    heat_loss = retrofit.calculate_fabric_heat_loss(buildings)
+    for column, values in heat_loss.items():
+        buildings[column] = values
+    # cache the pre-retrofit bins so each retrofit only bins its post-retrofit values
+    buildings["ber_code"], buildings["heat_pump_code"] = (
+        retrofit.get_pre_retrofit_codes(buildings)
+    )
+    return buildings
+
+
+@cache.cache_resource
+def load_buildings(url: str, data_dir: Path) -> pd.DataFrame:
+    """Load the building stock with its retrofit columns once per process.
+
+    The result is shared by every session so it must be treated as read-only,
+    derive selections from it via `load_selected_buildings`. Buildings are
+    sorted by small area so a selection only touches its own rows.
+
+    Args:
+        url (str): Location of the BER parquet
+        data_dir (Path): Local directory in which the parquet is cached
+
+    Returns:
+        pd.DataFrame: All buildings with total floor area & fabric heat loss
+    """
+    buildings = _load_buildings(
+        url=url, data_dir=data_dir, columns=schema.BUILDING_COLUMNS
+    )
+    return _add_retrofit_columns(filter.index_by_small_area(buildings))
+
+
+@cache.cache_resource
+def _load_small_area_offsets(url: str, data_dir: Path) -> np.ndarray:
+    buildings = load_buildings(url=url, data_dir=data_dir)
+    return filter.get_small_area_offsets(buildings["small_area"])
+
+
+def _get_selection_key(
+    small_areas: pd.Series,
+    selected_energy_ratings: List[str],
+    selected_small_areas: Optional[List[str]],
+) -> str:
+    # bitsets over the small area codes & energy rating bands are independent of
+    # the order & duplicates of a selection & far cheaper to hash than its labels
+    if selected_small_areas is None:
+        is_selected_small_area = np.ones(len(small_areas.cat.categories), dtype=bool)
+    else:
+        is_selected_small_area = small_areas.cat.categories.isin(selected_small_areas)
+    is_selected_energy_rating = np.isin(filter.ENERGY_RATINGS, selected_energy_ratings)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.packbits(is_selected_small_area).tobytes())
+    digest.update(np.packbits(is_selected_energy_rating).tobytes())
+    return digest.hexdigest()
 
 
-@st.cache_data
 def load_selected_buildings(
+    url: str,
+    data_dir: Path,
+    selected_energy_ratings: List[str],
+    selected_small_areas: Optional[List[str]],
+) -> pd.DataFrame:
+    """Select buildings from the building stock, caching recent selections.
+
+    Selections are cached in `get_selected_buildings_cache`, keyed by a digest of
+    the selection & bounded by the [cache] selected_buildings_max_mb memory
+    budget in config.ini. Results are shared so must be treated as read-only.
+
+    Args:
+        url (str): Location of the BER parquet
+        data_dir (Path): Local directory in which the parquet is cached
+        selected_energy_ratings (List[str]): Energy rating bands such as ["A", "G"]
+        selected_small_areas (Optional[List[str]]): Small area codes, None
+            selects all
+
+    Returns:
+        pd.DataFrame: Selected buildings
+    """
+    buildings = load_buildings(url=url, data_dir=data_dir)
+    key = (
+        url,
+        str(data_dir),
+        _get_selection_key(
+            buildings["small_area"],
+            selected_energy_ratings=selected_energy_ratings,
+            selected_small_areas=selected_small_areas,
+        ),
+    )
+    selected_buildings_cache = get_selected_buildings_cache()
+    selected_buildings = selected_buildings_cache.get(key)
+    if selected_buildings is None:
+        selected_buildings = filter.get_selected_buildings(
+            buildings=buildings,
+            selected_energy_ratings=selected_energy_ratings,
+            selected_small_areas=selected_small_areas,
+            small_area_offsets=_load_small_area_offsets(url=url, data_dir=data_dir),
+        )
+        selected_buildings_cache.put(key, selected_buildings)
+    return selected_buildings
+
+
+def read_selected_buildings(
     url: str,
     data_dir: Path,
     selected_energy_ratings: List[str],
     selected_small_areas: List[str],
 ) -> pd.DataFrame:
-    buildings = _load_buildings(url=url, data_dir=data_dir)
-    buildings_with_retrofit_columns = _add_retrofit_columns(buildings)
+    """Read only the selected buildings without loading the whole building stock.
+
+    Suited to one-off runs which don't keep a process-wide building table. If the
+    local parquet has been partitioned into data_dir by `dea.convert` only the
+    partitions touched by the selection are read, unless the parquet has changed
+    since, see `dea.convert.is_dataset_current`.
+    """
+    source_file_path = data_dir / url.split("/")[-1]
+    dataset_dir = _get_dataset_dir(url=url, data_dir=data_dir)
+    if source_file_path.exists() and convert.is_dataset_current(
+        source_file_path, dataset_dir
+    ):
+        buildings = read_buildings_dataset(
+            dataset_dir=dataset_dir,
+            selected_energy_ratings=selected_energy_ratings,
+            selected_small_areas=selected_small_areas,
+            columns=schema.BUILDING_COLUMNS,
+        )
+    else:
+        buildings = _load_buildings(
+            url=url,
+            data_dir=data_dir,
+            columns=schema.BUILDING_COLUMNS,
+            filters=_get_parquet_filters(
+                selected_energy_ratings=selected_energy_ratings,
+                selected_small_areas=selected_small_areas,
+            ),
+        )
+    buildings_with_retrofit_columns = _add_retrofit_columns(
+        filter.index_by_small_area(buildings)
+    )
     return filter.get_selected_buildings(
         buildings=buildings_with_retrofit_columns,
         selected_energy_ratings=selected_energy_ratings,
         selected_small_areas=selected_small_areas,
     )
+
+
+def _as_floats(value: Any) -> Any:
+    # streamlit inputs return 0.0 where defaults.json holds 0 so numbers are
+    # hashed as floats
+    if isinstance(value, dict):
+        return {k: _as_floats(v) for k, v in value.items()}
+    elif isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    else:
+        return value
+
+
+def _get_retrofit_summary_key(
+    url: str,
+    data_dir: Path,
+    selected_energy_ratings: List[str],
+    selected_small_areas: Optional[List[str]],
+    selections: Dict[str, Any],
+) -> str:
+    # the parquet is fetched first so the size & modification time of the local
+    # copy version it, which costs a stat rather than a read of the table
+    filepath = _fetch(url, data_dir=data_dir, filesystem_name="s3")
+    key = {
+        "version": RETROFIT_SUMMARY_VERSION,
+        "dataset_version": convert.get_file_version(filepath),
+        "selected_energy_ratings": sorted(set(selected_energy_ratings)),
+        "selected_small_areas": (
+            None if selected_small_areas is None else sorted(set(selected_small_areas))
+        ),
+        "selections": _as_floats(selections),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def load_retrofit_summary(
+    url: str,
+    data_dir: Path,
+    selected_energy_ratings: List[str],
+    selected_small_areas: Optional[List[str]],
+    selections: Dict[str, Any],
+    job: Optional[jobs.Job] = None,
+) -> retrofit.RetrofitSummary:
+    """Retrofit the selected buildings & summarise them, caching results on disk.
+
+    Summaries are cached in data_dir/results, keyed by a hash of the size &
+    modification time of the local parquet, the selection & the retrofit
+    properties, so every app process on a machine shares them & a cache hit
+    doesn't load the building stock. The cache is bounded by the [cache] results_max_mb
+    size budget in config.ini.
+
+    Args:
+        url (str): Location of the BER parquet
+        data_dir (Path): Local directory in which the parquet & results are
+            cached
+        selected_energy_ratings (List[str]): Energy rating bands such as ["A", "G"]
+        selected_small_areas (Optional[List[str]]): Small area codes, None
+            selects all
+        selections (Dict[str, Any]): Retrofit properties of each component
+        job (Optional[jobs.Job], optional): Job to which the stage & each
+            summary are reported as they complete. Defaults to None.
+
+    Returns:
+        retrofit.RetrofitSummary: Pre vs post retrofit summaries
+    """
+    from dea import CONFIG
+
+    job = job or jobs.Job()
+    job.set_stage("loading")
+    results_cache = cache.DiskCache(
+        cache_dir=data_dir / "results",
+        max_bytes=CONFIG.getint("cache", "results_max_mb", fallback=1024) * 2**20,
+    )
+    key = _get_retrofit_summary_key(
+        url=url,
+        data_dir=data_dir,
+        selected_energy_ratings=selected_energy_ratings,
+        selected_small_areas=selected_small_areas,
+        selections=selections,
+    )
+    frames = results_cache.get(key)
+    if frames is not None:
+        for name, frame in frames.items():
+            job.set_result(name, frame)
+        return retrofit.RetrofitSummary(**frames)
+
+    pre_retrofit = load_selected_buildings(
+        url=url,
+        data_dir=data_dir,
+        selected_energy_ratings=selected_energy_ratings,
+        selected_small_areas=selected_small_areas,
+    )
+    summary = retrofit.summarise_retrofit(pre_retrofit, selections=selections, job=job)
+    results_cache.put(key, frames=vars(summary))
+    return summary
+
+
+def submit_retrofit_summary(
+    url: str,
+    data_dir: Path,
+    selected_energy_ratings: List[str],
+    selected_small_areas: Optional[List[str]],
+    selections: Dict[str, Any],
+) -> jobs.Job:
+    """Run `load_retrofit_summary` in the background on the shared job manager.
+
+    Sessions submitting the same inputs while a job runs share that job, see
+    `dea.jobs.JobManager`.
+
+    Args:
+        url (str): Location of the BER parquet
+        data_dir (Path): Local directory in which the parquet & results are
+            cached
+        selected_energy_ratings (List[str]): Energy rating bands such as ["A", "G"]
+        selected_small_areas (Optional[List[str]]): Small area codes, None
+            selects all
+        selections (Dict[str, Any]): Retrofit properties of each component
+
+    Returns:
+        jobs.Job: Handle on the progress, partial results & result of the job
+    """
+    key = json.dumps(
+        {
+            "url": url,
+            "data_dir": str(data_dir),
+            "selected_energy_ratings": sorted(set(selected_energy_ratings)),
+            "selected_small_areas": (
+                None
+                if selected_small_areas is None
+                else sorted(set(selected_small_areas))
+            ),
+            "selections": _as_floats(selections),
+        },
+        sort_keys=True,
+    )
+    return jobs.get_job_manager().submit(
+        key,
+        partial(
+            load_retrofit_summary,
+            url=url,
+            data_dir=data_dir,
+            selected_energy_ratings=list(selected_energy_ratings),
+            selected_small_areas=(
+                None if selected_small_areas is None else list(selected_small_areas)
+            ),
+            selections=deepcopy(selections),
+        ),
+    )
@@ -0,0 +1,135 @@
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Optional
+
+from dea import cache
+
+STAGES = ["queued", "loading", "retrofitting", "summarising", "done"]
+
+
+@dataclass(frozen=True)
+class JobStatus:
+    """Snapshot of the progress of a job.
+
+    Attributes:
+        stage (str): Current stage, one of STAGES
+        results (Dict[str, Any]): Partial results completed so far by name
+        done (bool): Whether the job has finished or failed
+    """
+
+    stage: str
+    results: Dict[str, Any]
+    done: bool
+
+    @property
+    def fraction_complete(self) -> float:
+        return STAGES.index(self.stage) / (len(STAGES) - 1)
+
+
+class Job:
+    """Handle on a computation run by a JobManager.
+
+    The computation reports its stage & partial results via `set_stage` &
+    `set_result`, which any number of sessions can poll via `status`. A Job
+    created without a manager just records them.
+
+    Args:
+        key (Hashable, optional): Identity of the inputs. Defaults to None.
+    """
+
+    def __init__(self, key: Hashable = None):
+        self.key = key
+        self._lock = Lock()
+        self._stage = STAGES[0]
+        self._results: Dict[str, Any] = {}
+        self._future: Optional[Future] = None
+
+    def set_stage(self, stage: str) -> None:
+        if stage not in STAGES:
+            raise ValueError(f"stage must be one of {STAGES}")
+        with self._lock:
+            self._stage = stage
+
+    def set_result(self, name: str, value: Any) -> None:
+        with self._lock:
+            self._results[name] = value
+
+    def status(self) -> JobStatus:
+        with self._lock:
+            return JobStatus(
+                stage=self._stage,
+                results=dict(self._results),
+                done=self._future is not None and self._future.done(),
+            )
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """Wait for the job & return its result or raise its exception."""
+        return self._future.result(timeout=timeout)
+
+
+class JobManager:
+    """Run jobs on a pool of threads shared by every session.
+
+    Jobs are deduplicated by key while they run, so sessions submitting the
+    same inputs share one computation. Threads share the process-wide caches
+    of `dea.io` & numpy releases the GIL in the heavy lifting.
+
+    Args:
+        max_workers (int): Number of jobs run at once, others are queued
+    """
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dea-job"
+        )
+        self._jobs: Dict[Hashable, Job] = {}
+        self._lock = Lock()
+
+    def submit(self, key: Hashable, func: Callable[..., Any]) -> Job:
+        """Run func(job=job) unless a job with the same key is running.
+
+        Args:
+            key (Hashable): Identity of the inputs of func
+            func (Callable[..., Any]): Computation which reports its progress
+                to its job keyword argument
+
+        Returns:
+            Job: Handle on the new or running job
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                return job
+            job = Job(key)
+            self._jobs[key] = job
+            job._future = self._executor.submit(self._run, job, func)
+        # outside the lock as it runs at once if the job has already finished
+        job._future.add_done_callback(lambda _: self._forget(job))
+        return job
+
+    def _run(self, job: Job, func: Callable[..., Any]) -> Any:
+        result = func(job=job)
+        job.set_stage("done")
+        return result
+
+    def _forget(self, job: Job) -> None:
+        with self._lock:
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+@cache.cache_resource
+def get_job_manager() -> JobManager:
+    """Create the job manager shared by every session of this process."""
+    from dea import CONFIG
+
+    return JobManager(max_workers=CONFIG.getint("jobs", "max_workers", fallback=2))
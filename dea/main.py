@@ -0,0 +1,254 @@
+import argparse
+from copy import deepcopy
+import json
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import pandas as pd
+
+from dea import _DATA_DIR
+from dea import filter
+from dea import io
+from dea import montecarlo
+from dea import scenarios
+
+OUTPUT_FORMATS = ["parquet", "csv"]
+
+
+def _merge_selections(
+    defaults: Dict[str, Any], overrides: Dict[str, Any]
+) -> Dict[str, Any]:
+    merged = deepcopy(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge_selections(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def read_scenario_file(
+    filepath: Path, defaults: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """Read a JSON scenario file.
+
+    A scenario file holds the buildings selected & the retrofit properties of
+    each named scenario in the shape of defaults.json, for example:
+
+        {
+            "selected_energy_ratings": ["E", "F", "G"],
+            "selected_small_areas": ["267001001", "267001002"],
+            "number_of_draws": 100,
+            "scenarios": {
+                "walls": {"wall": {"percentage_selected": 0.5}},
+                "walls & roofs": {
+                    "wall": {"percentage_selected": 0.5},
+                    "roof": {"percentage_selected": 0.5}
+                }
+            }
+        }
+
+    Ratings & small areas default to all, and scenarios only need to set the
+    properties which differ from defaults. Every scenario must retrofit the same
+    components once merged with defaults. If number_of_draws is set each
+    scenario is also simulated over that many random selections of buildings,
+    see `dea.montecarlo.simulate_retrofits`.
+
+    Args:
+        filepath (Path): Path to the scenario file
+        defaults (Optional[Dict[str, Any]], optional): Retrofit properties of
+            each component. Defaults to None, which reads DEFAULTS.
+
+    Returns:
+        Dict[str, Any]: Selected buildings & complete retrofit properties of
+            each scenario
+    """
+    if defaults is None:
+        from dea import DEFAULTS
+
+        defaults = DEFAULTS
+    with open(filepath) as f:
+        scenario_file = json.load(f)
+    if not scenario_file.get("scenarios"):
+        raise ValueError(f"No scenarios in {filepath}")
+    merged_scenarios = {
+        name: _merge_selections(defaults, selections)
+        for name, selections in scenario_file["scenarios"].items()
+    }
+    try:
+        scenarios.get_components(list(merged_scenarios.values()))
+    except ValueError as error:
+        raise ValueError(f"{error} in {filepath}") from error
+    return {
+        "selected_energy_ratings": scenario_file.get(
+            "selected_energy_ratings", filter.ENERGY_RATINGS
+        ),
+        "selected_small_areas": scenario_file.get("selected_small_areas"),
+        "random_seed": scenario_file.get("random_seed", 42),
+        "number_of_draws": scenario_file.get("number_of_draws"),
+        "scenarios": merged_scenarios,
+    }
+
+
+def _name_scenarios(df: pd.DataFrame, names: List[str]) -> pd.DataFrame:
+    scenario = pd.Categorical.from_codes(df["scenario"], categories=names)
+    return df.drop(columns="scenario").assign(scenario=scenario)[
+        ["scenario"] + [c for c in df.columns if c != "scenario"]
+    ]
+
+
+def _get_percentiles(
+    buildings: pd.DataFrame,
+    selections_by_scenario: List[Dict[str, Any]],
+    number_of_draws: int,
+    random_seed: int,
+) -> Dict[str, pd.DataFrame]:
+    # quantiles of each outcome over all draws of every scenario, columns are
+    # named as strings as parquet doesn't store the booleans of heat pumps
+    percentiles = [
+        montecarlo.simulate_retrofits(
+            buildings,
+            selections,
+            number_of_draws=number_of_draws,
+            random_seed=random_seed,
+        ).percentiles()
+        for selections in selections_by_scenario
+    ]
+    return {
+        f"{name}_percentiles": pd.concat(
+            [
+                p[name]
+                .rename(columns=str)
+                .rename_axis("quantile")
+                .reset_index()
+                .assign(scenario=position)
+                for position, p in enumerate(percentiles)
+            ],
+            ignore_index=True,
+        )
+        for name in ["bers", "heat_pumps", "costs"]
+    }
+
+
+def run_scenario_file(
+    scenario_filepath: Path,
+    output_dir: Path,
+    url: Optional[str] = None,
+    data_dir: Path = _DATA_DIR,
+    output_format: str = "parquet",
+    number_of_draws: Optional[int] = None,
+) -> scenarios.ScenarioSummaries:
+    """Retrofit buildings in every scenario of a scenario file & save summaries.
+
+    Only the selected buildings are read, see `dea.io.read_selected_buildings`,
+    & all scenarios are evaluated together, see
+    `dea.scenarios.retrofit_scenarios`. The BER ratings, heat pump viability &
+    costs of every scenario are written to bers, heat_pumps & costs files in
+    output_dir. If a number of draws is set, the 5th, 50th & 95th percentiles of
+    each over random selections of buildings are written to bers_percentiles,
+    heat_pumps_percentiles & costs_percentiles files too.
+
+    Args:
+        scenario_filepath (Path): Path to the scenario file, see
+            `read_scenario_file`
+        output_dir (Path): Directory in which the summaries are written
+        url (Optional[str], optional): Location of the BER parquet. Defaults to
+            None, which reads CONFIG["urls"]["bers"].
+        data_dir (Path, optional): Local directory in which the parquet is
+            cached. Defaults to _DATA_DIR.
+        output_format (str, optional): One of OUTPUT_FORMATS. Defaults to
+            "parquet".
+        number_of_draws (Optional[int], optional): Number of random selections
+            of buildings simulated by scenario, overriding the scenario file.
+            Defaults to None.
+
+    Returns:
+        scenarios.ScenarioSummaries: Summaries by scenario name
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"output_format must be one of {OUTPUT_FORMATS}")
+    if url is None:
+        from dea import CONFIG
+
+        url = CONFIG["urls"]["bers"]
+    scenario_file = read_scenario_file(scenario_filepath)
+    buildings = io.read_selected_buildings(
+        url=url,
+        data_dir=Path(data_dir),
+        selected_energy_ratings=scenario_file["selected_energy_ratings"],
+        selected_small_areas=scenario_file["selected_small_areas"],
+    )
+    names = list(scenario_file["scenarios"])
+    summaries = scenarios.retrofit_scenarios(
+        buildings,
+        scenarios=list(scenario_file["scenarios"].values()),
+        random_seed=scenario_file["random_seed"],
+    )
+    named_summaries = scenarios.ScenarioSummaries(
+        bers=_name_scenarios(summaries.bers, names),
+        heat_pumps=_name_scenarios(summaries.heat_pumps, names),
+        costs=_name_scenarios(summaries.costs.reset_index(), names),
+    )
+
+    outputs = dict(vars(named_summaries))
+    number_of_draws = number_of_draws or scenario_file["number_of_draws"]
+    if number_of_draws:
+        percentiles = _get_percentiles(
+            buildings,
+            list(scenario_file["scenarios"].values()),
+            number_of_draws=number_of_draws,
+            random_seed=scenario_file["random_seed"],
+        )
+        outputs.update(
+            {name: _name_scenarios(df, names) for name, df in percentiles.items()}
+        )
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for name, summary in outputs.items():
+        filepath = output_dir / f"{name}.{output_format}"
+        if output_format == "csv":
+            summary.to_csv(filepath, index=False)
+        else:
+            summary.to_parquet(filepath, index=False)
+    return named_summaries
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog="python -m dea",
+        description="Retrofit buildings in every scenario of a scenario file",
+    )
+    parser.add_argument("scenario_filepath", type=Path)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument(
+        "--bers",
+        type=Path,
+        default=None,
+        help="Local BER parquet, defaults to the cached [urls] bers in config.ini",
+    )
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, default="parquet")
+    parser.add_argument(
+        "--draws",
+        type=int,
+        default=None,
+        help="Random selections of buildings simulated by scenario, defaults to "
+        "number_of_draws in the scenario file",
+    )
+
+    parsed_args = parser.parse_args(args)
+    if parsed_args.bers is not None:
+        url, data_dir = parsed_args.bers.name, parsed_args.bers.parent
+    else:
+        url, data_dir = None, _DATA_DIR
+    run_scenario_file(
+        parsed_args.scenario_filepath,
+        parsed_args.output_dir,
+        url=url,
+        data_dir=data_dir,
+        output_format=parsed_args.format,
+        number_of_draws=parsed_args.draws,
+    )
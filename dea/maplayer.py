@@ -0,0 +1,288 @@
+import argparse
+from dataclasses import dataclass
+from functools import cached_property
+import json
+import math
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import TYPE_CHECKING
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import Polygon
+
+from dea import convert
+
+# geopandas is slow to import & only needed to build a layer, not to read one
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+MAP_LAYER_VERSION = 4
+METADATA_FILENAME = "metadata.json"
+GEOJSON_FILENAME = "boundaries.geojson"
+POINTS_FILENAME = "points.parquet"
+GEOMETRIES_FILENAME = "geometries.parquet"
+SPATIAL_PREDICATES = ["intersects", "centroid"]
+TILES_DIRNAME = "tiles"
+TILE_INDEX_FILENAME = "index.json"
+
+# coarse to fine, a level is drawn once the viewport is at most max_viewport_m
+# wide & is split into tiles of tile_size_m so only those in view are fetched;
+# the first level is drawn in full on the first paint
+LEVELS_OF_DETAIL = [
+    {"tolerance_m": 250, "tile_size_m": None, "max_viewport_m": None},
+    {"tolerance_m": 50, "tile_size_m": 8000, "max_viewport_m": 25000},
+    {"tolerance_m": 5, "tile_size_m": 2000, "max_viewport_m": 6000},
+]
+
+
+@dataclass(frozen=True)
+class MapLayer:
+    """Boundaries prepared for mapping so no geometry work is done per request.
+
+    Attributes:
+        geojson (str): Boundaries at the coarsest level of detail as a GeoJSON
+            string
+        points (pd.DataFrame): Boundary centroids (x, y) & non-geometry columns
+        metadata (Dict[str, Any]): Source & parameters of the layer
+        tile_index (Dict[str, Any]): Origin & tiles of each level of detail
+        tiles (Dict[str, str]): GeoJSON of each tile by path relative to the
+            tiles directory, only held until written as tiles are then served
+            from disk
+        geometries (np.ndarray): Unsimplified boundaries in the order of points
+        tiles_url (Optional[str]): URL from which the tiles are served
+    """
+
+    geojson: str
+    points: pd.DataFrame
+    metadata: Dict[str, Any]
+    tile_index: Dict[str, Any]
+    tiles: Dict[str, str]
+    geometries: np.ndarray
+    tiles_url: Optional[str] = None
+
+    @cached_property
+    def _boundary_tree(self) -> shapely.STRtree:
+        return shapely.STRtree(self.geometries)
+
+    @cached_property
+    def _centroid_tree(self) -> shapely.STRtree:
+        return shapely.STRtree(
+            shapely.points(self.points["x"].to_numpy(), self.points["y"].to_numpy())
+        )
+
+    def query(self, polygon: Polygon, predicate: str = "intersects") -> np.ndarray:
+        """Find the boundaries selected by a polygon via an STRtree.
+
+        Args:
+            polygon (Polygon): Selection in the layer's projection
+            predicate (str, optional): Select boundaries that intersect the
+                polygon or whose centroid it contains, one of SPATIAL_PREDICATES.
+                Defaults to "intersects".
+
+        Returns:
+            np.ndarray: Sorted positions of the selected boundaries in points
+        """
+        if predicate == "intersects":
+            positions = self._boundary_tree.query(polygon, predicate="intersects")
+        elif predicate == "centroid":
+            positions = self._centroid_tree.query(polygon, predicate="contains")
+        else:
+            raise ValueError(f"predicate must be one of {SPATIAL_PREDICATES}")
+        return np.sort(positions)
+
+
+def _get_metadata(
+    input_file_path: Path, epsg: str, levels: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    return {
+        "version": MAP_LAYER_VERSION,
+        "source": input_file_path.name,
+        "source_version": convert.get_file_version(input_file_path),
+        "epsg": epsg,
+        "levels": levels,
+    }
+
+
+def _get_tile_range(lower: float, upper: float, origin: float, size: float):
+    return range(
+        math.floor((lower - origin) / size), math.floor((upper - origin) / size) + 1
+    )
+
+
+def _create_tiles(
+    geometries: "gpd.GeoSeries",
+    level: int,
+    tile_size_m: Optional[float],
+    origin: List[float],
+) -> Dict[str, str]:
+    if tile_size_m is None:
+        return {f"{level}/0_0.geojson": geometries.to_json()}
+    # a geometry is in every tile its bounds overlap, the client dedupes on its id
+    tiles: Dict[str, List[int]] = {}
+    for position, (minx, miny, maxx, maxy) in enumerate(geometries.bounds.to_numpy()):
+        for i in _get_tile_range(minx, maxx, origin[0], tile_size_m):
+            for j in _get_tile_range(miny, maxy, origin[1], tile_size_m):
+                tiles.setdefault(f"{level}/{i}_{j}.geojson", []).append(position)
+    return {
+        path: geometries.iloc[positions].to_json() for path, positions in tiles.items()
+    }
+
+
+def create_map_layer(
+    boundaries: "gpd.GeoDataFrame",
+    epsg: str = "3857",
+    levels: List[Dict[str, Any]] = LEVELS_OF_DETAIL,
+    metadata: Optional[Dict[str, Any]] = None,
+) -> MapLayer:
+    """Reproject, simplify & tile boundaries & find their centroids.
+
+    Args:
+        boundaries (gpd.GeoDataFrame): Boundaries to be mapped
+        epsg (str, optional): EPSG registry. CARTODBPOSITRON tile requires
+            epsg=3857. Defaults to "3857".
+        levels (List[Dict[str, Any]], optional): Simplification tolerance, tile
+            size & widest viewport of each level of detail, coarse to fine.
+            Defaults to LEVELS_OF_DETAIL.
+        metadata (Optional[Dict[str, Any]], optional): Source & parameters of
+            the layer. Defaults to None.
+
+    Returns:
+        MapLayer: Boundaries prepared for mapping
+    """
+    reprojected = boundaries.to_crs(epsg=epsg)
+    centroids = reprojected.geometry.centroid
+    points = pd.DataFrame(reprojected.drop(columns="geometry")).assign(
+        x=centroids.x, y=centroids.y
+    )
+    origin = [float(bound) for bound in reprojected.total_bounds[:2]]
+    tile_index = {"origin": origin, "levels": []}
+    tiles = {}
+    for level, properties in enumerate(levels):
+        level_tiles = _create_tiles(
+            reprojected.geometry.simplify(properties["tolerance_m"]),
+            level=level,
+            tile_size_m=properties["tile_size_m"],
+            origin=origin,
+        )
+        tile_index["levels"].append({**properties, "tiles": sorted(level_tiles)})
+        tiles.update(level_tiles)
+    return MapLayer(
+        geojson=tiles[tile_index["levels"][0]["tiles"][0]],
+        points=points,
+        metadata=metadata or {},
+        tile_index=tile_index,
+        tiles=tiles,
+        geometries=reprojected.geometry.to_numpy(),
+    )
+
+
+def write_map_layer(map_layer: MapLayer, output_dir: Path) -> None:
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / GEOJSON_FILENAME, "w") as f:
+        f.write(map_layer.geojson)
+    map_layer.points.to_parquet(output_dir / POINTS_FILENAME)
+    pd.DataFrame({"geometry": shapely.to_wkb(map_layer.geometries)}).to_parquet(
+        output_dir / GEOMETRIES_FILENAME
+    )
+    tiles_dir = output_dir / TILES_DIRNAME
+    tiles_dir.mkdir(exist_ok=True)
+    for path, geojson in map_layer.tiles.items():
+        (tiles_dir / path).parent.mkdir(parents=True, exist_ok=True)
+        with open(tiles_dir / path, "w") as f:
+            f.write(geojson)
+    with open(tiles_dir / TILE_INDEX_FILENAME, "w") as f:
+        json.dump(map_layer.tile_index, f)
+    # written last so a layer is only ever read once it is complete
+    with open(output_dir / METADATA_FILENAME, "w") as f:
+        json.dump(map_layer.metadata, f, indent=2)
+
+
+def read_map_layer(input_dir: Path) -> MapLayer:
+    input_dir = Path(input_dir)
+    with open(input_dir / METADATA_FILENAME) as f:
+        metadata = json.load(f)
+    with open(input_dir / GEOJSON_FILENAME) as f:
+        geojson = f.read()
+    points = pd.read_parquet(input_dir / POINTS_FILENAME)
+    geometries = shapely.from_wkb(
+        pd.read_parquet(input_dir / GEOMETRIES_FILENAME)["geometry"].to_numpy()
+    )
+    with open(input_dir / TILES_DIRNAME / TILE_INDEX_FILENAME) as f:
+        tile_index = json.load(f)
+    return MapLayer(
+        geojson=geojson,
+        points=points,
+        metadata=metadata,
+        tile_index=tile_index,
+        tiles={},
+        geometries=geometries,
+    )
+
+
+def is_map_layer_current(
+    input_file_path: Path,
+    map_layer_dir: Path,
+    epsg: str = "3857",
+    levels: List[Dict[str, Any]] = LEVELS_OF_DETAIL,
+) -> bool:
+    metadata_file_path = Path(map_layer_dir) / METADATA_FILENAME
+    if not metadata_file_path.exists():
+        return False
+    with open(metadata_file_path) as f:
+        metadata = json.load(f)
+    return metadata == _get_metadata(Path(input_file_path), epsg, levels)
+
+
+def convert_boundaries_to_map_layer(
+    input_file_path: Path,
+    output_dir: Path,
+    epsg: str = "3857",
+    levels: List[Dict[str, Any]] = LEVELS_OF_DETAIL,
+) -> MapLayer:
+    """Build & save the map layer & tile pyramid of a boundaries file.
+
+    The layer is versioned by the size & modification time of its source file
+    & its parameters, see `is_map_layer_current`. Tiles are written to a tiles
+    directory so they can be served as static files.
+
+    Args:
+        input_file_path (Path): Boundaries file readable by geopandas
+        output_dir (Path): Directory in which the layer is written
+        epsg (str, optional): EPSG registry. Defaults to "3857".
+        levels (List[Dict[str, Any]], optional): Levels of detail, see
+            `create_map_layer`. Defaults to LEVELS_OF_DETAIL.
+
+    Returns:
+        MapLayer: Boundaries prepared for mapping
+    """
+    import geopandas as gpd
+
+    input_file_path = Path(input_file_path)
+    map_layer = create_map_layer(
+        gpd.read_file(input_file_path),
+        epsg=epsg,
+        levels=levels,
+        metadata=_get_metadata(input_file_path, epsg, levels),
+    )
+    write_map_layer(map_layer, output_dir)
+    return map_layer
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the map layer of boundaries")
+    parser.add_argument("input_file_path", type=Path)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--epsg", default="3857")
+
+    args = parser.parse_args()
+    convert_boundaries_to_map_layer(
+        args.input_file_path,
+        args.output_dir,
+        epsg=args.epsg,
+    )
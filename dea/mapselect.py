@@ -1,42 +1,77 @@
 import json
 from typing import List
+from typing import TYPE_CHECKING
 
+from bokeh.events import SelectionGeometry
 from bokeh.models.plots import Plot
 from bokeh.plotting import figure
-#from bokeh.plotting import Figure
-from bokeh.models import ColumnDataSource
 from bokeh.models import CustomJS
 from bokeh.models import GeoJSONDataSource
 from bokeh.tile_providers import CARTODBPOSITRON
 from bokeh.tile_providers import get_provider
-import geopandas as gpd
-import pandas as pd
+from shapely.geometry import Polygon
 import streamlit as st
 from streamlit_bokeh_events import streamlit_bokeh_events
 
-
-
-def _convert_gdf_geometry_to_xy(gdf: gpd.GeoDataFrame, epsg: str) -> gpd.GeoDataFrame:
-    return (
-        gdf.to_crs(epsg=epsg)
-        .assign(
-            x=lambda gdf: gdf.geometry.centroid.x, y=lambda gdf: gdf.geometry.centroid.y
-        )
-        .drop(columns="geometry")
-    )
-
-
-
-def _convert_gdf_to_geojson_str(
-    gdf: gpd.GeoDataFrame, epsg: str, tolerance_m: int = 50
-) -> str:
-    boundaries = gdf.to_crs(epsg=epsg).geometry.simplify(tolerance_m)
-    return json.dumps(json.loads(boundaries.to_json()))
-
-
-def _plot_basemap(boundaries: gpd.GeoDataFrame, epsg: str):
-    geojson_str = _convert_gdf_to_geojson_str(boundaries, epsg=epsg)
-    gds_polygons = GeoJSONDataSource(geojson=geojson_str)
+if TYPE_CHECKING:
+    from dea.maplayer import MapLayer
+
+# swap in the tiles of the finest level of detail drawn at the viewport width,
+# debounced as ranges change continuously while panning
+_LOAD_TILES_JS = """
+const index = JSON.parse(tile_index);
+const width = x_range.end - x_range.start;
+let level = 0;
+index.levels.forEach((properties, position) => {
+    if (properties.max_viewport_m !== null && width <= properties.max_viewport_m) {
+        level = position;
+    }
+});
+const properties = index.levels[level];
+let paths = properties.tiles;
+if (properties.tile_size_m !== null) {
+    const available = new Set(properties.tiles);
+    const size = properties.tile_size_m;
+    const [x0, y0] = index.origin;
+    paths = [];
+    for (let i = Math.floor((x_range.start - x0) / size); i <= Math.floor((x_range.end - x0) / size); i++) {
+        for (let j = Math.floor((y_range.start - y0) / size); j <= Math.floor((y_range.end - y0) / size); j++) {
+            const path = `${level}/${i}_${j}.geojson`;
+            if (available.has(path)) {
+                paths.push(path);
+            }
+        }
+    }
+}
+const state = window.dea_map_tiles || (window.dea_map_tiles = {cache: {}, request: 0});
+const request = ++state.request;
+clearTimeout(state.timeout);
+state.timeout = setTimeout(() => {
+    Promise.all(paths.map((path) => {
+        const url = `${tiles_url}/${path}`;
+        if (!(url in state.cache)) {
+            state.cache[url] = fetch(url).then((response) => response.json());
+        }
+        return state.cache[url];
+    })).then((collections) => {
+        if (request !== state.request) {
+            return;
+        }
+        // a boundary spanning tiles is in each of them
+        const features = new Map();
+        collections.forEach((collection) => {
+            collection.features.forEach((feature) => features.set(feature.id, feature));
+        });
+        source.geojson = JSON.stringify(
+            {type: "FeatureCollection", features: Array.from(features.values())}
+        );
+    });
+}, 150);
+"""
+
+
+def _plot_basemap(map_layer: "MapLayer"):
+    gds_polygons = GeoJSONDataSource(geojson=map_layer.geojson)
     plot = figure(
         tools="pan, zoom_in, zoom_out, box_zoom, wheel_zoom, lasso_select",
         width=500,
@@ -52,68 +87,90 @@ def _plot_basemap(boundaries: gpd.GeoDataFrame, epsg: str):
         line_color="white",
         fill_color="teal",
     )
+    if map_layer.tiles_url is not None:
+        load_tiles = CustomJS(
+            args=dict(
+                source=gds_polygons,
+                x_range=plot.x_range,
+                y_range=plot.y_range,
+                tile_index=json.dumps(map_layer.tile_index),
+                tiles_url=map_layer.tiles_url,
+            ),
+            code=_LOAD_TILES_JS,
+        )
+        plot.x_range.js_on_change("end", load_tiles)
+        plot.y_range.js_on_change("end", load_tiles)
     return plot
 
 
-def _plot_points(plot: Plot, points: pd.DataFrame) -> figure:
-    cds_lasso = ColumnDataSource(points)
-    cds_lasso.selected.js_on_change(
-        "indices",
+def _send_lasso_geometry(plot: Plot) -> Plot:
+    plot.js_on_event(
+        SelectionGeometry,
         CustomJS(
-            args=dict(source=cds_lasso),
             code="""
-            document.dispatchEvent(
-                new CustomEvent("LASSO_SELECT", {detail: {data: source.selected.indices}})
-            )
+            const geometry = cb_obj.geometry;
+            if (cb_obj.final && geometry.type === "poly") {
+                document.dispatchEvent(
+                    new CustomEvent("LASSO_GEOMETRY", {detail: {x: geometry.x, y: geometry.y}})
+                )
+            }
             """,
         ),
     )
-    plot.circle("x", "y", fill_alpha=1, size=1.5, source=cds_lasso)
     return plot
 
 
-def _get_points_on_selection(
-    column_name: str, bokeh_plot: Plot, points: gpd.GeoDataFrame
+def _get_boundaries_in_lasso(
+    column_name: str,
+    bokeh_plot: Plot,
+    map_layer: "MapLayer",
+    spatial_predicate: str,
 ) -> List[str]:
     lasso_selected = streamlit_bokeh_events(
         bokeh_plot=bokeh_plot,
-        events="LASSO_SELECT",
+        events="LASSO_GEOMETRY",
         key="bar",
         refresh_on_update=False,
         debounce_time=0,
     )
     if lasso_selected:
-        try:
-            indices_selected = lasso_selected.get("LASSO_SELECT")["data"]
-        except:
+        geometry = lasso_selected.get("LASSO_GEOMETRY")
+        if geometry is None or len(geometry["x"]) < 3:
             raise ValueError(f"No '{column_name}' selected!")
-        points_selected = points.iloc[indices_selected][column_name]
+        lasso = Polygon(zip(geometry["x"], geometry["y"])).buffer(0)
+        positions = map_layer.query(lasso, predicate=spatial_predicate)
+        boundaries_selected = map_layer.points[column_name].iloc[positions]
     else:
-        points_selected = points[column_name]
-    return points_selected.to_list()
+        boundaries_selected = map_layer.points[column_name]
+    return boundaries_selected.to_list()
 
 
 def mapselect(
-    column_name: str, boundaries: gpd.GeoDataFrame, epsg: str = "3857"
+    column_name: str, map_layer: "MapLayer", spatial_predicate: str = "centroid"
 ) -> List[str]:
     """Select Polygons on a map corresponding to column_name.
 
+    The lasso polygon is sent to the server & resolved against the boundaries,
+    see `MapLayer.query`.
+
     Args:
         column_name (str): Column in boundaries to be filtered by map selection
-        boundaries (gpd.GeoDataFrame): Boundaries to be mapped
-        epsg (str, optional):  EPSG registry. CARTODBPOSITRON tile requires epsg=3857.
-            Defaults to "3857".
+        map_layer (MapLayer): Boundaries prepared for mapping in EPSG:3857 as
+            CARTODBPOSITRON tile requires, see `dea.io.load_map_layer`
+        spatial_predicate (str, optional): One of SPATIAL_PREDICATES in
+            `dea.maplayer`. Defaults to "centroid".
 
     Returns:
         List[str]: Polygons selected
     """
     st.subheader(f"Filter by {column_name}")
     st.markdown("> Click on the `Lasso Select` tool on the toolbar below!")
-    points = _convert_gdf_geometry_to_xy(boundaries, epsg=epsg)
-    basemap = _plot_basemap(boundaries, epsg=epsg)
-    pointmap = _plot_points(plot=basemap, points=points)
-    points_selected = _get_points_on_selection(
-        column_name=column_name, bokeh_plot=pointmap, points=points
+    basemap = _plot_basemap(map_layer)
+    points_selected = _get_boundaries_in_lasso(
+        column_name=column_name,
+        bokeh_plot=_send_lasso_geometry(basemap),
+        map_layer=map_layer,
+        spatial_predicate=spatial_predicate,
     )
     with st.expander(f"Show selected {column_name}"):
         st.write(str(points_selected))
@@ -0,0 +1,308 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+import numpy as np
+import pandas as pd
+
+from dea import filter
+from dea import retrofit
+
+DeaSelection = Dict[str, Any]
+
+# bound the (draws x buildings) arrays evaluated at once
+MAX_CHUNK_SIZE = 2**22
+
+# set in each worker process by _initialise so arrays are sent once per worker;
+# in-process runs pass theirs to _simulate_chunk as jobs may run on several threads
+_SIMULATION: Optional["_Simulation"] = None
+
+
+@dataclass(frozen=True)
+class MonteCarloResult:
+    """Outcomes of many random draws of which buildings are retrofitted.
+
+    Attributes:
+        bers (pd.DataFrame): Post-retrofit number of buildings in each BER rating
+            by draw
+        heat_pumps (pd.DataFrame): Post-retrofit number of buildings viable (True)
+            or not (False) for a heat pump by draw
+        costs (pd.DataFrame): Retrofit costs [M€] by draw
+    """
+
+    bers: pd.DataFrame
+    heat_pumps: pd.DataFrame
+    costs: pd.DataFrame
+
+    def percentiles(
+        self, q: Sequence[float] = (0.05, 0.5, 0.95)
+    ) -> Dict[str, pd.DataFrame]:
+        """Summarise the distribution of each outcome over all draws.
+
+        Args:
+            q (Sequence[float], optional): Quantiles. Defaults to (0.05, 0.5, 0.95).
+
+        Returns:
+            Dict[str, pd.DataFrame]: Quantiles of bers, heat_pumps & costs
+        """
+        return {
+            "bers": self.bers.quantile(q),
+            "heat_pumps": self.heat_pumps.quantile(q),
+            "costs": self.costs.quantile(q),
+        }
+
+
+@dataclass(frozen=True)
+class _Component:
+    name: str
+    viable: np.ndarray
+    uvalue_improvement: np.ndarray
+    areas: np.ndarray
+    number_selected: int
+    cost_lower: float
+    cost_upper: float
+
+
+@dataclass(frozen=True)
+class _Simulation:
+    components: List[_Component]
+    heat_loss_coefficient: np.ndarray
+    heat_loss_per_year: np.ndarray
+    energy_value: np.ndarray
+    heat_loss_parameter: np.ndarray
+    total_floor_area: np.ndarray
+    pre_retrofit_ber_codes: np.ndarray
+    pre_retrofit_heat_pump_codes: np.ndarray
+    sample_costs: bool
+
+
+def _create_simulation(
+    buildings: pd.DataFrame, selections: DeaSelection, sample_costs: bool
+) -> _Simulation:
+    components = []
+    for component, properties in selections.items():
+        # compared as stored, see `dea.retrofit._shuffle_viable_buildings`
+        stored_uvalues = buildings[component + "_uvalue"].to_numpy()
+        threshold = stored_uvalues.dtype.type(properties["uvalue"]["threshold"])
+        viable = np.flatnonzero(stored_uvalues > threshold)
+        uvalues = stored_uvalues.astype("float64")
+        components.append(
+            _Component(
+                name=component,
+                viable=viable,
+                uvalue_improvement=(uvalues[viable] - properties["uvalue"]["target"]),
+                areas=buildings[component + "_area"].to_numpy("float64")[viable],
+                number_selected=retrofit._get_number_selected(
+                    len(viable), properties["percentage_selected"]
+                ),
+                cost_lower=properties["cost"]["lower"],
+                cost_upper=properties["cost"]["upper"],
+            )
+        )
+    pre_retrofit_ber_codes, pre_retrofit_heat_pump_codes = (
+        retrofit.get_pre_retrofit_codes(buildings)
+    )
+    return _Simulation(
+        components=components,
+        heat_loss_coefficient=buildings["fabric_heat_loss_w_per_k"].to_numpy("float64"),
+        heat_loss_per_year=buildings["fabric_heat_loss_kwh_per_y"].to_numpy("float64"),
+        energy_value=buildings["energy_value"].to_numpy("float64"),
+        heat_loss_parameter=buildings["heat_loss_parameter"].to_numpy("float64"),
+        total_floor_area=buildings["total_floor_area"].to_numpy("float64"),
+        pre_retrofit_ber_codes=pre_retrofit_ber_codes,
+        pre_retrofit_heat_pump_codes=pre_retrofit_heat_pump_codes,
+        sample_costs=sample_costs,
+    )
+
+
+def _initialise(simulation: _Simulation) -> None:
+    global _SIMULATION
+    _SIMULATION = simulation
+
+
+def _sample_without_replacement(
+    rng: np.random.Generator, number_of_draws: int, size: int, number_selected: int
+) -> np.ndarray:
+    # (draws x number_selected) positions, each row an independent exact-k sample
+    if number_selected == 0:
+        return np.empty((number_of_draws, 0), dtype="int64")
+    elif number_selected == size:
+        return np.tile(np.arange(size), (number_of_draws, 1))
+    else:
+        keys = rng.random((number_of_draws, size))
+        return np.argpartition(keys, number_selected - 1, axis=1)[:, :number_selected]
+
+
+def _count_changes(
+    draws: np.ndarray,
+    pre_retrofit_codes: np.ndarray,
+    post_retrofit_codes: np.ndarray,
+    number_of_draws: int,
+    number_of_codes: int,
+) -> np.ndarray:
+    # net change in the number of buildings with each code by draw
+    size = number_of_draws * number_of_codes
+    is_pre_valid = pre_retrofit_codes >= 0
+    is_post_valid = post_retrofit_codes >= 0
+    added = np.bincount(
+        (draws * number_of_codes + post_retrofit_codes)[is_post_valid], minlength=size
+    )
+    removed = np.bincount(
+        (draws * number_of_codes + pre_retrofit_codes)[is_pre_valid], minlength=size
+    )
+    return (added - removed).reshape(number_of_draws, number_of_codes)
+
+
+def _simulate_chunk(
+    simulation: _Simulation, seed: np.random.SeedSequence, number_of_draws: int
+) -> dict:
+    rng = np.random.default_rng(seed)
+    number_of_buildings = len(simulation.energy_value)
+
+    # (draws x buildings) so improvements are summed over components without a sort
+    heat_loss_improvements = np.zeros((number_of_draws, number_of_buildings))
+    is_changed = np.zeros((number_of_draws, number_of_buildings), dtype=bool)
+    costs = {}
+    for component in simulation.components:
+        selected = _sample_without_replacement(
+            rng,
+            number_of_draws=number_of_draws,
+            size=len(component.viable),
+            number_selected=component.number_selected,
+        )
+        # rows are unique within a draw so a fancy-indexed add doesn't drop any
+        rows = np.arange(number_of_draws)[:, None], component.viable[selected]
+        areas = component.areas[selected]
+        heat_loss_improvements[rows] += component.uvalue_improvement[selected] * areas
+        is_changed[rows] = True
+        if simulation.sample_costs:
+            rates = rng.uniform(component.cost_lower, component.cost_upper, areas.shape)
+            costs[component.name + "_cost"] = np.nansum(rates * areas, axis=1)
+        else:
+            costs[component.name + "_cost_lower"] = np.nansum(
+                component.cost_lower * areas, axis=1
+            )
+            costs[component.name + "_cost_upper"] = np.nansum(
+                component.cost_upper * areas, axis=1
+            )
+
+    # only retrofitted buildings change so counts are updated from those alone
+    changed = np.flatnonzero(is_changed)
+    heat_loss_improvement = heat_loss_improvements.ravel()[changed]
+    draws = changed // number_of_buildings
+    rows = changed % number_of_buildings
+
+    post_retrofit_heat_loss_per_year = retrofit._calculate_heat_loss_per_year(
+        simulation.heat_loss_coefficient[rows] - heat_loss_improvement
+    )
+    energy_value_improvement = (
+        simulation.heat_loss_per_year[rows] - post_retrofit_heat_loss_per_year
+    ) / simulation.total_floor_area[rows]
+    energy_value_improvement[np.isnan(energy_value_improvement)] = 0
+    post_retrofit_ber_codes = retrofit.get_ber_codes(
+        simulation.energy_value[rows] - energy_value_improvement
+    )
+    post_retrofit_heat_pump_codes = retrofit.get_heat_pump_codes(
+        simulation.heat_loss_parameter[rows]
+        - heat_loss_improvement / simulation.total_floor_area[rows]
+    )
+    return {
+        "bers": _count_changes(
+            draws,
+            pre_retrofit_codes=simulation.pre_retrofit_ber_codes[rows],
+            post_retrofit_codes=post_retrofit_ber_codes,
+            number_of_draws=number_of_draws,
+            number_of_codes=len(filter.BER_RATINGS),
+        ),
+        "heat_pumps": _count_changes(
+            draws,
+            pre_retrofit_codes=simulation.pre_retrofit_heat_pump_codes[rows],
+            post_retrofit_codes=post_retrofit_heat_pump_codes,
+            number_of_draws=number_of_draws,
+            number_of_codes=len(retrofit.HEAT_PUMP_VIABILITY),
+        ),
+        "costs": pd.DataFrame(costs),
+    }
+
+
+def _simulate_initialised_chunk(
+    seed: np.random.SeedSequence, number_of_draws: int
+) -> dict:
+    return _simulate_chunk(_SIMULATION, seed, number_of_draws)
+
+
+def simulate_retrofits(
+    buildings: pd.DataFrame,
+    selections: DeaSelection,
+    number_of_draws: int = 100,
+    sample_costs: bool = False,
+    random_seed: int = 42,
+    max_workers: Optional[int] = None,
+) -> MonteCarloResult:
+    """Retrofit a different random selection of viable buildings in each draw.
+
+    Draws are generated in chunks, each vectorised across its draws, & chunks
+    run in parallel across processes. Results depend only on random_seed, not
+    on the number of workers.
+
+    Args:
+        buildings (pd.DataFrame): Pre-retrofit buildings with retrofit columns,
+            see `dea.io.load_buildings`
+        selections (DeaSelection): Retrofit properties of each component
+        number_of_draws (int, optional): Number of draws. Defaults to 100.
+        sample_costs (bool, optional): Sample the cost of each retrofit
+            uniformly between its lower & upper cost rather than reporting both.
+            Defaults to False.
+        random_seed (int, optional): Seed of all draws. Defaults to 42.
+        max_workers (Optional[int], optional): Number of processes, 1 runs in
+            this process. Defaults to the number of CPUs.
+
+    Returns:
+        MonteCarloResult: BER ratings, heat pump viability & costs by draw
+    """
+    simulation = _create_simulation(buildings, selections, sample_costs=sample_costs)
+    chunk_size = max(1, MAX_CHUNK_SIZE // max(len(buildings), 1))
+    chunks = [
+        min(chunk_size, number_of_draws - start)
+        for start in range(0, number_of_draws, chunk_size)
+    ]
+    seeds = np.random.SeedSequence(random_seed).spawn(len(chunks))
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(chunks))
+    if max_workers <= 1:
+        results = [_simulate_chunk(simulation, s, n) for s, n in zip(seeds, chunks)]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_initialise, initargs=(simulation,)
+        ) as executor:
+            results = list(executor.map(_simulate_initialised_chunk, seeds, chunks))
+
+    pre_retrofit_ber_counts = retrofit._count_codes(
+        simulation.pre_retrofit_ber_codes, len(filter.BER_RATINGS)
+    )
+    pre_retrofit_heat_pump_counts = retrofit._count_codes(
+        simulation.pre_retrofit_heat_pump_codes, len(retrofit.HEAT_PUMP_VIABILITY)
+    )
+    costs = pd.concat([r["costs"] for r in results], ignore_index=True).divide(1e6)
+    if sample_costs:
+        costs["total_cost"] = costs.sum(axis=1)
+    else:
+        costs["total_cost_lower"] = costs.filter(like="_cost_lower").sum(axis=1)
+        costs["total_cost_upper"] = costs.filter(like="_cost_upper").sum(axis=1)
+    return MonteCarloResult(
+        bers=pd.DataFrame(
+            pre_retrofit_ber_counts + np.concatenate([r["bers"] for r in results]),
+            columns=filter.BER_RATINGS,
+        ).rename_axis("draw"),
+        heat_pumps=pd.DataFrame(
+            pre_retrofit_heat_pump_counts
+            + np.concatenate([r["heat_pumps"] for r in results]),
+            columns=retrofit.HEAT_PUMP_VIABILITY,
+        ).rename_axis("draw"),
+        costs=costs.rename_axis("draw"),
+    )
@@ -1,7 +1,6 @@
 from typing import Any
 from typing import Dict
 
-import altair as alt
 import icontract
 import numpy as np
 import pandas as pd
@@ -14,6 +13,13 @@ import streamlit as st
     )
 )
 def plot_ber_rating_comparison(pre_vs_post_retrofit_bers: pd.DataFrame) -> None:
+    # altair is slow to import & only needed once a retrofit is submitted
+    import altair as alt
+
+    # streamlit & altair don't recognise category
+    pre_vs_post_retrofit_bers = pre_vs_post_retrofit_bers.astype(
+        {"energy_rating": "string"}
+    )
     chart = (
         alt.Chart(pre_vs_post_retrofit_bers)
         .mark_bar()
@@ -38,9 +44,14 @@ def plot_ber_rating_comparison(pre_vs_post_retrofit_bers: pd.DataFrame) -> None:
     )
 )
 def plot_heat_pump_viability_comparison(pre_vs_post_retrofit_hps: pd.DataFrame) -> None:
-    pre_vs_post_retrofit_hps["viability"] = pre_vs_post_retrofit_hps[
-        "is_viable_for_a_heat_pump"
-    ].astype("string")
+    import altair as alt
+
+    # summaries are shared by sessions polling the same job so aren't modified
+    pre_vs_post_retrofit_hps = pre_vs_post_retrofit_hps.assign(
+        viability=pre_vs_post_retrofit_hps["is_viable_for_a_heat_pump"].astype(
+            "string"
+        )
+    )
     chart = (
         alt.Chart(pre_vs_post_retrofit_hps)
         .mark_bar()
@@ -58,14 +69,9 @@ def plot_heat_pump_viability_comparison(pre_vs_post_retrofit_hps: pd.DataFrame)
     st.altair_chart(chart)
 
 
-def plot_retrofit_costs(post_retrofit: pd.DataFrame) -> None:
-    cost_columns = [c for c in post_retrofit.columns if "cost" in c]
-    costs = (
-        post_retrofit[cost_columns]
-        .sum()
-        .divide(1e6)
-        .round(2)
-        .rename("M€")
-        .reset_index()
+def plot_retrofit_costs(costs: pd.DataFrame) -> None:
+    st.write(
+        costs.assign(total=costs["total"].divide(1e6).round(2)).rename(
+            columns={"total": "M€"}
+        )
     )
-    st.write(costs)
@@ -1,197 +1,488 @@
+from dataclasses import dataclass
 from typing import Any
 from typing import Dict
-from typing import List
+from typing import Optional
+from typing import Tuple
 
 import icontract
 import numpy as np
 import pandas as pd
-from rcbm import fab
 from rcbm import htuse
-from rcbm import vent
+
+from dea import filter
+from dea import jobs
+from dea import schema
+
+# energy values [kWh/m²y] bounding each BER rating in filter.BER_RATINGS
+BER_BINS = [
+    -np.inf,
+    25,
+    50,
+    75,
+    100,
+    125,
+    150,
+    175,
+    200,
+    225,
+    260,
+    300,
+    340,
+    380,
+    450,
+    np.inf,
+]
+# buildings with a heat loss parameter [W/Km²] at or below this suit a heat pump
+HEAT_PUMP_VIABILITY_THRESHOLD = 2.3
+# heat pump codes index these labels
+HEAT_PUMP_VIABILITY = [True, False]
+THERMAL_BRIDGING_FACTOR = 0.05
+HEATING_MONTHS = ["jan", "feb", "mar", "apr", "may", "oct", "nov", "dec"]
+# mean internal-external temperature difference x hours summed over the heating
+# season, in thousands so that W/K x kilohours = kWh
+HEATING_SEASON_KILOHOURS = (
+    htuse.DELTA_T_BY_MONTH[HEATING_MONTHS] * htuse.HOURS_PER_MONTH[HEATING_MONTHS]
+).sum() / 1000
+
+
+def _shuffle_viable_buildings(
+    uvalues: np.ndarray, threshold_uvalue: float, random_seed: int = 42
+) -> np.ndarray:
+    # positions of the buildings over threshold in random order, any percentage
+    # selected is a prefix of this shuffle, the threshold is compared in the
+    # precision of the U-values as np.float32(0.6) > 0.6
+    where_uvalue_is_over_threshold = np.flatnonzero(
+        uvalues > uvalues.dtype.type(threshold_uvalue)
+    )
+    rng = np.random.default_rng(random_seed)
+    return rng.permutation(where_uvalue_is_over_threshold)
+
+
+def _rank_viable_buildings(
+    uvalues: np.ndarray, threshold_uvalue: float, random_seed: int = 42
+) -> Tuple[np.ndarray, np.ndarray]:
+    # buildings under threshold are ranked last & so are never selected
+    shuffled = _shuffle_viable_buildings(uvalues, threshold_uvalue, random_seed)
+    ranks = np.full(len(uvalues), len(shuffled), dtype="int64")
+    ranks[shuffled] = np.arange(len(shuffled))
+    return ranks, shuffled
 
 
 def _get_viable_buildings(
-    uvalues: pd.DataFrame,
+    uvalues: np.ndarray,
     threshold_uvalue: float,
     percentage_selected: float,
     random_seed: int = 42,
-) -> pd.Series:
-    where_uvalue_is_over_threshold = uvalues > threshold_uvalue
-    subset_over_threshold = uvalues[where_uvalue_is_over_threshold].sample(
-        frac=percentage_selected, random_state=random_seed
-    )
-    return uvalues.index.isin(subset_over_threshold.index)
+) -> np.ndarray:
+    shuffled = _shuffle_viable_buildings(uvalues, threshold_uvalue, random_seed)
+    number_selected = _get_number_selected(len(shuffled), percentage_selected)
+    is_selected = np.zeros(len(uvalues), dtype=bool)
+    is_selected[shuffled[:number_selected]] = True
+    return is_selected
+
+
+def select_viable_buildings(
+    buildings: pd.DataFrame, selections: Dict[str, Any], random_seed: int = 42
+) -> Dict[str, np.ndarray]:
+    """Randomly select a percentage of the buildings viable for each retrofit.
+
+    Each component is shuffled by its own generator seeded with random_seed, so a
+    selection is reproducible & a higher percentage selects a superset of a
+    lower one.
+
+    Args:
+        buildings (pd.DataFrame): Buildings
+        selections (Dict[str, Any]): Retrofit properties of each component
+        random_seed (int, optional): Seed of the selection. Defaults to 42.
+
+    Returns:
+        Dict[str, np.ndarray]: Whether each building is selected by component
+    """
+    return {
+        component: _get_viable_buildings(
+            uvalues=buildings[component + "_uvalue"].to_numpy(),
+            threshold_uvalue=properties["uvalue"]["threshold"],
+            percentage_selected=properties["percentage_selected"],
+            random_seed=random_seed,
+        )
+        for component, properties in selections.items()
+    }
+
+
+def _get_number_selected(number_viable: int, percentage_selected: float) -> int:
+    return round(percentage_selected * number_viable)
 
 
 def _estimate_cost_of_fabric_retrofits(
-    is_selected: pd.Series,
+    is_selected: np.ndarray,
     cost: float,
-    areas: pd.Series,
-) -> pd.Series:
-    return pd.Series([cost] * is_selected * areas, dtype="int64")
+    areas: np.ndarray,
+) -> np.ndarray:
+    costs = np.where(is_selected, cost * areas.astype("float64"), 0)
+    return np.nan_to_num(costs).astype("int64")
+
+
+@dataclass(frozen=True)
+class RetrofitResult:
+    """Post-retrofit buildings stored as changes to the pre-retrofit buildings.
+
+    Only the retrofitted U-values, costs & heat loss are held alongside a
+    reference to the pre-retrofit buildings which are never modified.
+
+    Attributes:
+        buildings (pd.DataFrame): Pre-retrofit buildings
+        uvalues (Dict[str, np.ndarray]): Post-retrofit U-values of each
+            retrofitted component
+        costs (pd.DataFrame): Lower & upper cost of retrofitting each component
+        fabric_heat_loss_w_per_k (np.ndarray): Post-retrofit heat loss coefficient
+        fabric_heat_loss_kwh_per_y (np.ndarray): Post-retrofit annual heat loss
+    """
+
+    buildings: pd.DataFrame
+    uvalues: Dict[str, np.ndarray]
+    costs: pd.DataFrame
+    fabric_heat_loss_w_per_k: np.ndarray
+    fabric_heat_loss_kwh_per_y: np.ndarray
+
+    def to_frame(self) -> pd.DataFrame:
+        """Copy the pre-retrofit buildings & overwrite them with the retrofits."""
+        post_retrofit = self.buildings.copy()
+        for component, uvalues in self.uvalues.items():
+            post_retrofit[component + "_uvalue"] = uvalues
+        post_retrofit[self.costs.columns] = self.costs
+        post_retrofit["fabric_heat_loss_w_per_k"] = self.fabric_heat_loss_w_per_k
+        post_retrofit["fabric_heat_loss_kwh_per_y"] = self.fabric_heat_loss_kwh_per_y
+        return post_retrofit
+
+
+def _get_fabric_heat_loss(buildings: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    if "fabric_heat_loss_w_per_k" in buildings.columns:
+        heat_loss_coefficient = buildings["fabric_heat_loss_w_per_k"].to_numpy(
+            dtype="float64", copy=True
+        )
+        heat_loss_per_year = buildings["fabric_heat_loss_kwh_per_y"].to_numpy(
+            dtype="float64", copy=True
+        )
+    else:
+        heat_loss = calculate_fabric_heat_loss(buildings)
+        heat_loss_coefficient = heat_loss["fabric_heat_loss_w_per_k"].to_numpy()
+        heat_loss_per_year = heat_loss["fabric_heat_loss_kwh_per_y"].to_numpy()
+    return heat_loss_coefficient, heat_loss_per_year
 
 
 def retrofit_buildings(
     buildings: pd.DataFrame,
     selections: Dict[str, Any],
-) -> pd.DataFrame:
-    post_retrofit = buildings.copy()
+) -> RetrofitResult:
+    """Retrofit a percentage of the viable components of buildings.
+
+    Heat loss is a sum over components so only the retrofitted components of the
+    retrofitted buildings are recalculated; the thermal bridging term depends
+    on areas alone & so is unchanged by a retrofit.
+
+    Args:
+        buildings (pd.DataFrame): Pre-retrofit buildings, these are not modified
+        selections (Dict[str, Any]): Retrofit properties of each component
+
+    Returns:
+        RetrofitResult: Post-retrofit U-values, costs & heat loss
+    """
+    heat_loss_coefficient, heat_loss_per_year = _get_fabric_heat_loss(buildings)
+    viable_buildings = select_viable_buildings(buildings, selections)
+    post_retrofit_uvalues = {}
+    costs = {}
     for component, properties in selections.items():
-        where_is_viable_building = _get_viable_buildings(
-            uvalues=buildings[component + "_uvalue"],
-            threshold_uvalue=properties["uvalue"]["threshold"],
-            percentage_selected=properties["percentage_selected"],
+        where_is_viable_building = viable_buildings[component]
+        uvalues = buildings[component + "_uvalue"].to_numpy()
+        areas = buildings[component + "_area"].to_numpy()
+        target_uvalue = properties["uvalue"]["target"]
+
+        post_retrofit_uvalues[component] = np.where(
+            where_is_viable_building, uvalues.dtype.type(target_uvalue), uvalues
         )
-        post_retrofit.loc[where_is_viable_building, component + "_uvalue"] = properties[
-            "uvalue"
-        ]["target"]
-        post_retrofit[component + "_cost_lower"] = _estimate_cost_of_fabric_retrofits(
+        costs[component + "_cost_lower"] = _estimate_cost_of_fabric_retrofits(
             is_selected=where_is_viable_building,
             cost=properties["cost"]["lower"],
-            areas=buildings[component + "_area"],
+            areas=areas,
         )
-        post_retrofit[component + "_cost_upper"] = _estimate_cost_of_fabric_retrofits(
+        costs[component + "_cost_upper"] = _estimate_cost_of_fabric_retrofits(
             is_selected=where_is_viable_building,
             cost=properties["cost"]["upper"],
-            areas=buildings[component + "_area"],
+            areas=areas,
+        )
+
+        rows = np.flatnonzero(where_is_viable_building)
+        heat_loss_coefficient[rows] += (target_uvalue - uvalues[rows]) * areas[rows]
+        heat_loss_per_year[rows] = _calculate_heat_loss_per_year(
+            heat_loss_coefficient[rows]
         )
-    return calculate_fabric_heat_loss(post_retrofit)
-
-
-def calculate_fabric_heat_loss(buildings: pd.DataFrame) -> pd.Series:
-    buildings["fabric_heat_loss_w_per_k"] = fab.calculate_fabric_heat_loss( #in the fab file doenst exist calculate_fabric_heat_loss so replace by calculate_fabric_heat_loss_coefficient 
-        roof_area=buildings["roof_area"],
-        roof_uvalue=buildings["roof_uvalue"],
-        wall_area=buildings["wall_area"],
-        wall_uvalue=buildings["wall_uvalue"],
-        floor_area=buildings["floor_area"],
-        floor_uvalue=buildings["floor_uvalue"],
-        window_area=buildings["window_area"],
-        window_uvalue=buildings["window_uvalue"],
-        door_area=buildings["door_area"],
-        door_uvalue=buildings["door_uvalue"],
-        thermal_bridging_factor=0.05,
+
+    return RetrofitResult(
+        buildings=buildings,
+        uvalues=post_retrofit_uvalues,
+        costs=pd.DataFrame(costs, index=buildings.index),
+        fabric_heat_loss_w_per_k=heat_loss_coefficient,
+        fabric_heat_loss_kwh_per_y=heat_loss_per_year,
+    )
+
+
+def _get_component_matrix(buildings: pd.DataFrame, suffix: str) -> np.ndarray:
+    return np.column_stack(
+        [
+            buildings[f"{component}_{suffix}"].to_numpy(dtype="float64")
+            for component in schema.COMPONENTS
+        ]
+    )
+
+
+def _calculate_heat_loss_coefficient(
+    areas: np.ndarray,
+    uvalues: np.ndarray,
+    thermal_bridging_factor: float = THERMAL_BRIDGING_FACTOR,
+) -> np.ndarray:
+    # as in rcbm.fab.calculate_fabric_heat_loss for (buildings x components) arrays
+    heat_loss_via_plane_elements = np.einsum("ij,ij->i", areas, uvalues)
+    thermal_bridging = thermal_bridging_factor * areas.sum(axis=1)
+    return heat_loss_via_plane_elements + thermal_bridging
+
+
+def _calculate_heat_loss_per_year(heat_loss_coefficient: np.ndarray) -> np.ndarray:
+    # as in rcbm.htuse.calculate_heat_loss_per_year which sums missing values to 0
+    heat_loss = np.round(heat_loss_coefficient * HEATING_SEASON_KILOHOURS)
+    heat_loss[np.isnan(heat_loss)] = 0
+    return heat_loss
+
+
+def calculate_fabric_heat_loss(buildings: pd.DataFrame) -> pd.DataFrame:
+    heat_loss_coefficient = _calculate_heat_loss_coefficient(
+        areas=_get_component_matrix(buildings, "area"),
+        uvalues=_get_component_matrix(buildings, "uvalue"),
     )
-    buildings["fabric_heat_loss_kwh_per_y"] = htuse.calculate_heat_loss_per_year(
-        buildings["fabric_heat_loss_w_per_k"]
+    return pd.DataFrame(
+        {
+            "fabric_heat_loss_w_per_k": heat_loss_coefficient,
+            "fabric_heat_loss_kwh_per_y": _calculate_heat_loss_per_year(
+                heat_loss_coefficient
+            ),
+        },
+        index=buildings.index,
     )
-    return buildings
-
-
-def _get_ber_rating(energy_values: pd.Series) -> pd.Series:
-    return (
-        pd.cut(
-            energy_values,
-            [
-                -np.inf,
-                25,
-                50,
-                75,
-                100,
-                125,
-                150,
-                175,
-                200,
-                225,
-                260,
-                300,
-                340,
-                380,
-                450,
-                np.inf,
-            ],
-            labels=[
-                "A1",
-                "A2",
-                "A3",
-                "B1",
-                "B2",
-                "B3",
-                "C1",
-                "C2",
-                "C3",
-                "D1",
-                "D2",
-                "E1",
-                "E2",
-                "F",
-                "G",
-            ],
+
+
+def get_ber_codes(energy_values: np.ndarray) -> np.ndarray:
+    """Bin energy values into the positions of their BER ratings.
+
+    Args:
+        energy_values (np.ndarray): Energy values [kWh/m²y] of any shape
+
+    Returns:
+        np.ndarray: Codes of filter.BER_RATINGS, -1 where missing
+    """
+    # side="left" puts a value on a bin edge in the lower bin as pd.cut does
+    codes = np.searchsorted(BER_BINS, energy_values, side="left") - 1
+    codes[np.isnan(energy_values)] = -1
+    return codes.astype("int8")
+
+
+def get_heat_pump_codes(heat_loss_parameters: np.ndarray) -> np.ndarray:
+    """Bin heat loss parameters into the positions of HEAT_PUMP_VIABILITY.
+
+    Args:
+        heat_loss_parameters (np.ndarray): Heat loss parameters [W/Km²] of any
+            shape
+
+    Returns:
+        np.ndarray: 0 if viable for a heat pump, 1 if not, -1 where missing
+    """
+    codes = (heat_loss_parameters > HEAT_PUMP_VIABILITY_THRESHOLD).astype("int8")
+    codes[np.isnan(heat_loss_parameters)] = -1
+    return codes
+
+
+def get_pre_retrofit_codes(buildings: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the BER & heat pump codes of buildings, cached on the base table.
+
+    Args:
+        buildings (pd.DataFrame): Pre-retrofit buildings
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: BER & heat pump codes
+    """
+    if "ber_code" in buildings.columns:
+        ber_codes = buildings["ber_code"].to_numpy()
+    else:
+        ber_codes = get_ber_codes(buildings["energy_value"].to_numpy("float64"))
+    if "heat_pump_code" in buildings.columns:
+        heat_pump_codes = buildings["heat_pump_code"].to_numpy()
+    else:
+        heat_pump_codes = get_heat_pump_codes(
+            buildings["heat_loss_parameter"].to_numpy("float64")
         )
-        .rename("energy_rating")
-        .astype("string")
-    )  # streamlit & altair don't recognise category
+    return ber_codes, heat_pump_codes
+
+
+def _count_codes(codes: np.ndarray, number_of_codes: int) -> np.ndarray:
+    return np.bincount(codes[codes >= 0], minlength=number_of_codes)
 
 
 @icontract.ensure(
     lambda result, column: np.array_equal(result.columns, [column, "category", "total"])
 )
 def _get_size_of_pre_vs_post_category(
-    pre_retrofit_category: pd.Series, post_retrofit_category: pd.Series, column: str
+    pre_retrofit_codes: np.ndarray,
+    post_retrofit_codes: np.ndarray,
+    labels: list,
+    column: str,
 ) -> pd.DataFrame:
-    return (
-        pd.concat(
-            [
-                pre_retrofit_category.to_frame().assign(category="Pre"),
-                post_retrofit_category.to_frame().assign(category="Post"),
-            ]
-        )
-        .groupby([column, "category"])
-        .size()
-        .rename("total")
-        .reset_index()
+    counts = pd.DataFrame(
+        {
+            column: pd.Categorical.from_codes(
+                np.repeat(np.arange(len(labels)), 2), categories=labels
+            ),
+            "category": ["Post", "Pre"] * len(labels),
+            "total": np.column_stack(
+                [
+                    _count_codes(post_retrofit_codes, len(labels)),
+                    _count_codes(pre_retrofit_codes, len(labels)),
+                ]
+            ).ravel(),
+        }
     )
+    return counts.query("total > 0").reset_index(drop=True)
 
 
-def calculate_ber_improvement(
-    pre_retrofit: pd.DataFrame, post_retrofit: pd.DataFrame
-) -> pd.Series:
+def _get_transitions(
+    pre_retrofit_codes: np.ndarray,
+    post_retrofit_codes: np.ndarray,
+    labels: list,
+    column: str,
+) -> pd.DataFrame:
+    is_valid = (pre_retrofit_codes >= 0) & (post_retrofit_codes >= 0)
+    transitions = np.bincount(
+        (pre_retrofit_codes.astype("int64") * len(labels) + post_retrofit_codes)[
+            is_valid
+        ],
+        minlength=len(labels) ** 2,
+    ).reshape(len(labels), len(labels))
+    return pd.DataFrame(
+        transitions,
+        index=pd.CategoricalIndex(labels, categories=labels, name="Pre " + column),
+        columns=pd.CategoricalIndex(labels, categories=labels, name="Post " + column),
+    )
+
+
+def _get_post_retrofit_ber_codes(
+    pre_retrofit: pd.DataFrame, post_retrofit: RetrofitResult
+) -> np.ndarray:
     energy_value_improvement = (
-        pre_retrofit["fabric_heat_loss_kwh_per_y"]
-        - post_retrofit["fabric_heat_loss_kwh_per_y"]
-    ) / pre_retrofit["total_floor_area"]
-    pre_retrofit_bers = _get_ber_rating(pre_retrofit["energy_value"])
-    post_retrofit_bers = _get_ber_rating(
-        pre_retrofit["energy_value"] - energy_value_improvement.fillna(0)
+        pre_retrofit["fabric_heat_loss_kwh_per_y"].to_numpy("float64")
+        - post_retrofit.fabric_heat_loss_kwh_per_y
+    ) / pre_retrofit["total_floor_area"].to_numpy("float64")
+    energy_value_improvement[np.isnan(energy_value_improvement)] = 0
+    return get_ber_codes(
+        pre_retrofit["energy_value"].to_numpy("float64") - energy_value_improvement
+    )
+
+
+def _get_post_retrofit_heat_pump_codes(
+    pre_retrofit: pd.DataFrame, post_retrofit: RetrofitResult
+) -> np.ndarray:
+    heat_loss_improvement = (
+        pre_retrofit["fabric_heat_loss_w_per_k"].to_numpy("float64")
+        - post_retrofit.fabric_heat_loss_w_per_k
     )
+    post_retrofit_heat_loss_parameter = pre_retrofit["heat_loss_parameter"].to_numpy(
+        "float64"
+    ) - heat_loss_improvement / pre_retrofit["total_floor_area"].to_numpy("float64")
+    return get_heat_pump_codes(post_retrofit_heat_loss_parameter)
+
+
+def calculate_ber_improvement(
+    pre_retrofit: pd.DataFrame, post_retrofit: RetrofitResult
+) -> pd.DataFrame:
+    pre_retrofit_codes, _ = get_pre_retrofit_codes(pre_retrofit)
     return _get_size_of_pre_vs_post_category(
-        pre_retrofit_category=pre_retrofit_bers,
-        post_retrofit_category=post_retrofit_bers,
+        pre_retrofit_codes=pre_retrofit_codes,
+        post_retrofit_codes=_get_post_retrofit_ber_codes(pre_retrofit, post_retrofit),
+        labels=filter.BER_RATINGS,
         column="energy_rating",
     )
 
 
-def _bin_viable_for_heat_pumps(heat_loss_parameter):
-    return (
-        pd.cut(
-            heat_loss_parameter,
-            bins=[-np.inf, 2.3, np.inf],
-            labels=[True, False],
-        )
-        .astype(bool)
-        .rename("is_viable_for_a_heat_pump")
+def calculate_ber_transitions(
+    pre_retrofit: pd.DataFrame, post_retrofit: RetrofitResult
+) -> pd.DataFrame:
+    """Count the buildings moving from each pre- to each post-retrofit BER rating.
+
+    Args:
+        pre_retrofit (pd.DataFrame): Pre-retrofit buildings
+        post_retrofit (RetrofitResult): Post-retrofit buildings
+
+    Returns:
+        pd.DataFrame: Number of buildings by pre (rows) & post (columns) rating
+    """
+    pre_retrofit_codes, _ = get_pre_retrofit_codes(pre_retrofit)
+    return _get_transitions(
+        pre_retrofit_codes=pre_retrofit_codes,
+        post_retrofit_codes=_get_post_retrofit_ber_codes(pre_retrofit, post_retrofit),
+        labels=filter.BER_RATINGS,
+        column="energy_rating",
     )
 
 
 def calculate_heat_pump_viability_improvement(
-    pre_retrofit: pd.DataFrame, post_retrofit: pd.DataFrame
-) -> pd.Series:
-    pre_retrofit_viability = _bin_viable_for_heat_pumps(
-        pre_retrofit["heat_loss_parameter"]
-    )
-    heat_loss_improvement = (
-        pre_retrofit["fabric_heat_loss_w_per_k"]
-        - post_retrofit["fabric_heat_loss_w_per_k"]
-    )
-    post_retrofit_heat_loss_parameter = (
-        pre_retrofit["heat_loss_parameter"]
-        - heat_loss_improvement / pre_retrofit["total_floor_area"]
-    )
-    post_retrofit_viability = _bin_viable_for_heat_pumps(
-        post_retrofit_heat_loss_parameter
-    )
+    pre_retrofit: pd.DataFrame, post_retrofit: RetrofitResult
+) -> pd.DataFrame:
+    _, pre_retrofit_codes = get_pre_retrofit_codes(pre_retrofit)
     return _get_size_of_pre_vs_post_category(
-        pre_retrofit_category=pre_retrofit_viability,
-        post_retrofit_category=post_retrofit_viability,
+        pre_retrofit_codes=pre_retrofit_codes,
+        post_retrofit_codes=_get_post_retrofit_heat_pump_codes(
+            pre_retrofit, post_retrofit
+        ),
+        labels=HEAT_PUMP_VIABILITY,
         column="is_viable_for_a_heat_pump",
     )
+
+
+@dataclass(frozen=True)
+class RetrofitSummary:
+    """Pre vs post retrofit summaries of one retrofit.
+
+    Attributes:
+        bers (pd.DataFrame): Number of buildings in each BER rating
+        heat_pumps (pd.DataFrame): Number of buildings viable for a heat pump
+        costs (pd.DataFrame): Total cost [€] of each retrofit
+    """
+
+    bers: pd.DataFrame
+    heat_pumps: pd.DataFrame
+    costs: pd.DataFrame
+
+
+def summarise_retrofit(
+    pre_retrofit: pd.DataFrame,
+    selections: Dict[str, Any],
+    job: Optional[jobs.Job] = None,
+) -> RetrofitSummary:
+    """Retrofit buildings & summarise their BER ratings, heat pumps & costs.
+
+    Args:
+        pre_retrofit (pd.DataFrame): Pre-retrofit buildings
+        selections (Dict[str, Any]): Retrofit properties of each component
+        job (Optional[jobs.Job], optional): Job to which the stage & each
+            summary are reported as they complete. Defaults to None.
+
+    Returns:
+        RetrofitSummary: Pre vs post retrofit summaries
+    """
+    job = job or jobs.Job()
+    job.set_stage("retrofitting")
+    post_retrofit = retrofit_buildings(buildings=pre_retrofit, selections=selections)
+    job.set_stage("summarising")
+    bers = calculate_ber_improvement(pre_retrofit, post_retrofit)
+    job.set_result("bers", bers)
+    heat_pumps = calculate_heat_pump_viability_improvement(pre_retrofit, post_retrofit)
+    job.set_result("heat_pumps", heat_pumps)
+    costs = post_retrofit.costs.sum().rename_axis("cost").reset_index(name="total")
+    job.set_result("costs", costs)
+    return RetrofitSummary(bers=bers, heat_pumps=heat_pumps, costs=costs)
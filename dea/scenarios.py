@@ -0,0 +1,462 @@
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+from dataclasses import dataclass
+from itertools import product
+from itertools import repeat
+from multiprocessing.shared_memory import SharedMemory
+import os
+from typing import Any
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from dea import filter
+from dea import retrofit
+
+DeaSelection = Dict[str, Any]
+
+# bound the (buildings x scenarios) arrays evaluated at once
+MAX_CHUNK_SIZE = 2**22
+
+# fewer buildings per process cost more to start & merge than they save
+MIN_SHARD_SIZE = 10_000
+
+# building columns & ranks, set in each worker process by _attach; in-process
+# runs pass theirs to _retrofit_shard as jobs may run on several threads
+_COLUMNS: Optional[Dict[Hashable, np.ndarray]] = None
+_SHARED_MEMORY: List[SharedMemory] = []
+
+
+@dataclass(frozen=True)
+class ScenarioSummaries:
+    """Tidy pre vs post retrofit summaries of many retrofit scenarios.
+
+    Attributes:
+        bers (pd.DataFrame): Number of buildings in each BER rating by scenario
+        heat_pumps (pd.DataFrame): Number of buildings viable for a heat pump by
+            scenario
+        costs (pd.DataFrame): Total cost [€] of each retrofit by scenario
+    """
+
+    bers: pd.DataFrame
+    heat_pumps: pd.DataFrame
+    costs: pd.DataFrame
+
+
+def get_scenario_grid(
+    defaults: DeaSelection,
+    percentages_selected: Optional[Dict[str, List[float]]] = None,
+    target_uvalues: Optional[Dict[str, List[float]]] = None,
+) -> List[DeaSelection]:
+    """Create a scenario for every combination of percentages & target U-values.
+
+    Args:
+        defaults (DeaSelection): Retrofit properties of each component, see
+            defaults.json
+        percentages_selected (Optional[Dict[str, List[float]]], optional):
+            Percentages of viable components retrofitted. Defaults to None.
+        target_uvalues (Optional[Dict[str, List[float]]], optional): U-values
+            to which components are retrofitted. Defaults to None.
+
+    Returns:
+        List[DeaSelection]: Retrofit properties of each component by scenario
+    """
+    axes = [
+        (component, "percentage_selected", values)
+        for component, values in (percentages_selected or {}).items()
+    ] + [
+        (component, "target", values)
+        for component, values in (target_uvalues or {}).items()
+    ]
+    scenarios = []
+    for combination in product(*[values for *_, values in axes]):
+        scenario = deepcopy(defaults)
+        for (component, parameter, _), value in zip(axes, combination):
+            if parameter == "target":
+                scenario[component]["uvalue"]["target"] = value
+            else:
+                scenario[component][parameter] = value
+        scenarios.append(scenario)
+    return scenarios
+
+
+def get_components(scenarios: List[DeaSelection]) -> List[str]:
+    """Get the components retrofitted by every scenario.
+
+    Args:
+        scenarios (List[DeaSelection]): Retrofit properties of each component by
+            scenario
+
+    Raises:
+        ValueError: If there are no scenarios or they retrofit different
+            components
+
+    Returns:
+        List[str]: Components in the order of the first scenario
+    """
+    if not scenarios:
+        raise ValueError("No scenarios to retrofit")
+    components = list(scenarios[0])
+    for position, scenario in enumerate(scenarios[1:], start=1):
+        if set(scenario) != set(components):
+            raise ValueError(
+                f"Scenario {position} retrofits {sorted(scenario)} but scenario 0"
+                f" retrofits {sorted(components)}, every scenario must set the"
+                " same components"
+            )
+    return components
+
+
+def _get_selected_ranks(
+    buildings: pd.DataFrame, scenarios: List[DeaSelection], random_seed: int
+) -> Dict[Tuple[str, float], Tuple[np.ndarray, np.ndarray]]:
+    # scenarios retrofitting a component over the same threshold share one shuffle,
+    # so a higher percentage selected retrofits a superset of a lower percentage
+    ranks = {}
+    for scenario in scenarios:
+        for component, properties in scenario.items():
+            key = (component, properties["uvalue"]["threshold"])
+            if key not in ranks:
+                ranks[key] = retrofit._rank_viable_buildings(
+                    uvalues=buildings[component + "_uvalue"].to_numpy(),
+                    threshold_uvalue=properties["uvalue"]["threshold"],
+                    random_seed=random_seed,
+                )
+    return ranks
+
+
+def _count_by_scenario(codes: np.ndarray, number_of_codes: int) -> np.ndarray:
+    # codes are (buildings x scenarios) with -1 for missing values
+    number_of_scenarios = codes.shape[1]
+    offsets = np.arange(number_of_scenarios) * number_of_codes
+    is_valid = codes >= 0
+    counts = np.bincount(
+        (codes + offsets)[is_valid], minlength=number_of_scenarios * number_of_codes
+    )
+    return counts.reshape(number_of_scenarios, number_of_codes)
+
+
+def _get_columns(
+    buildings: pd.DataFrame,
+    components: List[str],
+    ranks: Dict[Tuple[str, float], Tuple[np.ndarray, np.ndarray]],
+) -> Dict[Hashable, np.ndarray]:
+    columns = {
+        column: buildings[column].to_numpy("float64")
+        for column in [
+            "fabric_heat_loss_w_per_k",
+            "fabric_heat_loss_kwh_per_y",
+            "total_floor_area",
+            "energy_value",
+            "heat_loss_parameter",
+        ]
+    }
+    for component in components:
+        for suffix in ["_uvalue", "_area"]:
+            columns[component + suffix] = buildings[component + suffix].to_numpy(
+                "float64"
+            )
+    # ranks are global so each shard selects exactly its share of a selection
+    for key, (component_ranks, _) in ranks.items():
+        columns[key] = component_ranks
+    return columns
+
+
+def _get_number_selected(
+    scenarios: List[DeaSelection],
+    ranks: Dict[Tuple[str, float], Tuple[np.ndarray, np.ndarray]],
+) -> Dict[str, np.ndarray]:
+    return {
+        component: np.array(
+            [
+                retrofit._get_number_selected(
+                    len(ranks[(component, s[component]["uvalue"]["threshold"])][1]),
+                    s[component]["percentage_selected"],
+                )
+                for s in scenarios
+            ],
+            dtype="int64",
+        )
+        for component in scenarios[0]
+    }
+
+
+def _get_costs(
+    buildings: pd.DataFrame,
+    scenarios: List[DeaSelection],
+    ranks: Dict[Tuple[str, float], Tuple[np.ndarray, np.ndarray]],
+    number_selected: Dict[str, np.ndarray],
+) -> pd.DataFrame:
+    costs = {}
+    for component in scenarios[0]:
+        areas = buildings[component + "_area"].to_numpy("float64")
+        thresholds = np.array([s[component]["uvalue"]["threshold"] for s in scenarios])
+        for bound in ["lower", "upper"]:
+            cost = np.array([s[component]["cost"][bound] for s in scenarios])
+            total_cost = np.empty(len(scenarios), dtype="int64")
+            for threshold, unique_cost in set(zip(thresholds, cost)):
+                # selections are prefixes of the shuffle so their costs are too
+                _, shuffled = ranks[(component, threshold)]
+                scenario_columns = np.flatnonzero(
+                    (thresholds == threshold) & (cost == unique_cost)
+                )
+                building_costs = np.nan_to_num(unique_cost * areas[shuffled])
+                cumulative_costs = np.concatenate(
+                    [[0], np.cumsum(building_costs.astype("int64"))]
+                )
+                total_cost[scenario_columns] = cumulative_costs[
+                    number_selected[component][scenario_columns]
+                ]
+            costs[f"{component}_cost_{bound}"] = total_cost
+    return pd.DataFrame(costs).rename_axis("scenario")
+
+
+def _share(
+    columns: Dict[Hashable, np.ndarray],
+) -> Tuple[List[SharedMemory], Dict[Hashable, Tuple[str, str, int]]]:
+    blocks, specs = [], {}
+    for key, values in columns.items():
+        block = SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        blocks.append(block)
+        specs[key] = (block.name, values.dtype.str, len(values))
+    return blocks, specs
+
+
+def _attach(specs: Dict[Hashable, Tuple[str, str, int]]) -> None:
+    global _COLUMNS
+    # blocks are held for the life of the worker as the arrays view their buffers
+    columns = {}
+    for key, (name, dtype, length) in specs.items():
+        block = SharedMemory(name=name)
+        _SHARED_MEMORY.append(block)
+        columns[key] = np.ndarray((length,), dtype=dtype, buffer=block.buf)
+    _COLUMNS = columns
+
+
+def _get_shard_bounds(small_areas: pd.Series, number_of_shards: int) -> np.ndarray:
+    # shards end where the small area changes so buildings sorted by small area,
+    # see `dea.filter.index_by_small_area`, are sharded by small area
+    codes = pd.factorize(small_areas)[0]
+    block_starts = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    targets = np.linspace(0, len(codes), number_of_shards + 1)[1:-1]
+    if len(block_starts) > 0:
+        positions = np.searchsorted(block_starts, targets).clip(
+            max=len(block_starts) - 1
+        )
+        cuts = block_starts[positions]
+    else:
+        cuts = np.empty(0, dtype="int64")
+    return np.unique(np.concatenate([[0], cuts, [len(codes)]]))
+
+
+def _retrofit_chunk(
+    columns: Dict[Hashable, np.ndarray],
+    scenarios: List[DeaSelection],
+    number_selected: Dict[str, np.ndarray],
+) -> Tuple[np.ndarray, np.ndarray]:
+    number_of_buildings = len(columns["energy_value"])
+    heat_loss_improvement = np.zeros((number_of_buildings, len(scenarios)))
+    is_selected = np.empty((number_of_buildings, len(scenarios)), dtype=bool)
+    for component in scenarios[0]:
+        uvalues = columns[component + "_uvalue"]
+        areas = columns[component + "_area"]
+        thresholds = np.array([s[component]["uvalue"]["threshold"] for s in scenarios])
+        targets = np.array([s[component]["uvalue"]["target"] for s in scenarios])
+        for threshold in np.unique(thresholds):
+            scenario_columns = np.flatnonzero(thresholds == threshold)
+            is_selected[:, scenario_columns] = (
+                columns[(component, threshold)][:, None]
+                < number_selected[component][scenario_columns]
+            )
+
+        heat_loss_improvement += np.where(
+            is_selected, (uvalues[:, None] - targets) * areas[:, None], 0
+        )
+
+    post_retrofit_heat_loss_per_year = retrofit._calculate_heat_loss_per_year(
+        columns["fabric_heat_loss_w_per_k"][:, None] - heat_loss_improvement
+    )
+    total_floor_area = columns["total_floor_area"][:, None]
+    energy_value_improvement = (
+        columns["fabric_heat_loss_kwh_per_y"][:, None]
+        - post_retrofit_heat_loss_per_year
+    ) / total_floor_area
+    energy_value_improvement[np.isnan(energy_value_improvement)] = 0
+    post_retrofit_energy_values = (
+        columns["energy_value"][:, None] - energy_value_improvement
+    )
+    post_retrofit_heat_loss_parameters = (
+        columns["heat_loss_parameter"][:, None]
+        - heat_loss_improvement / total_floor_area
+    )
+    ber_counts = _count_by_scenario(
+        retrofit.get_ber_codes(post_retrofit_energy_values), len(filter.BER_RATINGS)
+    )
+    heat_pump_counts = _count_by_scenario(
+        retrofit.get_heat_pump_codes(post_retrofit_heat_loss_parameters),
+        len(retrofit.HEAT_PUMP_VIABILITY),
+    )
+    return ber_counts, heat_pump_counts
+
+
+def _retrofit_shard(
+    columns: Dict[Hashable, np.ndarray],
+    scenarios: List[DeaSelection],
+    number_selected: Dict[str, np.ndarray],
+    start: int,
+    stop: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    columns = {key: values[start:stop] for key, values in columns.items()}
+    chunk_size = max(1, MAX_CHUNK_SIZE // max(stop - start, 1))
+    ber_counts, heat_pump_counts = [], []
+    for chunk_start in range(0, len(scenarios), chunk_size):
+        chunk = slice(chunk_start, chunk_start + chunk_size)
+        chunk_ber_counts, chunk_heat_pump_counts = _retrofit_chunk(
+            columns,
+            scenarios=scenarios[chunk],
+            number_selected={c: n[chunk] for c, n in number_selected.items()},
+        )
+        ber_counts.append(chunk_ber_counts)
+        heat_pump_counts.append(chunk_heat_pump_counts)
+    return np.concatenate(ber_counts), np.concatenate(heat_pump_counts)
+
+
+def _retrofit_attached_shard(
+    scenarios: List[DeaSelection],
+    number_selected: Dict[str, np.ndarray],
+    start: int,
+    stop: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    return _retrofit_shard(_COLUMNS, scenarios, number_selected, start, stop)
+
+
+def _to_tidy_counts(
+    pre_retrofit_counts: np.ndarray,
+    post_retrofit_counts: np.ndarray,
+    labels: list,
+    column: str,
+) -> pd.DataFrame:
+    number_of_scenarios = post_retrofit_counts.shape[0]
+    counts = pd.concat(
+        [
+            pd.DataFrame(
+                {
+                    "scenario": np.repeat(np.arange(number_of_scenarios), len(labels)),
+                    column: pd.Categorical.from_codes(
+                        np.tile(np.arange(len(labels)), number_of_scenarios),
+                        categories=labels,
+                    ),
+                    "category": category,
+                    "total": counts.ravel(),
+                }
+            )
+            for category, counts in [
+                ("Post", post_retrofit_counts),
+                ("Pre", np.tile(pre_retrofit_counts, (number_of_scenarios, 1))),
+            ]
+        ]
+    )
+    return (
+        counts.query("total > 0")
+        .sort_values(["scenario", column, "category"], kind="stable")
+        .reset_index(drop=True)
+    )
+
+
+def retrofit_scenarios(
+    buildings: pd.DataFrame,
+    scenarios: List[DeaSelection],
+    random_seed: int = 42,
+    max_workers: Optional[int] = None,
+) -> ScenarioSummaries:
+    """Summarise the BER ratings, heat pump viability & costs of many retrofits.
+
+    Scenarios are evaluated together as (buildings x scenarios) arrays, and those
+    retrofitting a component over the same threshold share one random selection
+    of viable buildings. Buildings are split into shards by small area which run
+    in parallel across processes, reading the building columns from shared
+    memory, & their counts are summed. Viable buildings are ranked & costs
+    summed over all buildings before sharding so results don't depend on the
+    number of workers.
+
+    Args:
+        buildings (pd.DataFrame): Pre-retrofit buildings with retrofit columns,
+            see `dea.io.load_buildings`
+        scenarios (List[DeaSelection]): Retrofit properties of each component by
+            scenario, each retrofitting the same components, see
+            `get_components`
+        random_seed (int, optional): Seed of the selection of viable buildings.
+            Defaults to 42.
+        max_workers (Optional[int], optional): Number of processes, 1 runs in
+            this process. Shards hold at least MIN_SHARD_SIZE buildings.
+            Defaults to the number of CPUs.
+
+    Returns:
+        ScenarioSummaries: Pre vs post retrofit summaries indexed by the position
+            of each scenario in scenarios
+    """
+    components = get_components(scenarios)
+    ranks = _get_selected_ranks(buildings, scenarios, random_seed=random_seed)
+    columns = _get_columns(buildings, components=components, ranks=ranks)
+    number_selected = _get_number_selected(scenarios, ranks=ranks)
+
+    max_workers = min(
+        max_workers or os.cpu_count() or 1, max(1, len(buildings) // MIN_SHARD_SIZE)
+    )
+    if max_workers <= 1:
+        results = [
+            _retrofit_shard(columns, scenarios, number_selected, 0, len(buildings))
+        ]
+    else:
+        bounds = _get_shard_bounds(buildings["small_area"], max_workers)
+        blocks, specs = _share(columns)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=max_workers, initializer=_attach, initargs=(specs,)
+            ) as executor:
+                results = list(
+                    executor.map(
+                        _retrofit_attached_shard,
+                        repeat(scenarios),
+                        repeat(number_selected),
+                        bounds[:-1],
+                        bounds[1:],
+                    )
+                )
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+    ber_counts = sum(r[0] for r in results)
+    heat_pump_counts = sum(r[1] for r in results)
+
+    pre_retrofit_ber_codes, pre_retrofit_heat_pump_codes = (
+        retrofit.get_pre_retrofit_codes(buildings)
+    )
+    pre_retrofit_ber_counts = _count_by_scenario(
+        pre_retrofit_ber_codes[:, None], len(filter.BER_RATINGS)
+    )[0]
+    pre_retrofit_heat_pump_counts = _count_by_scenario(
+        pre_retrofit_heat_pump_codes[:, None], len(retrofit.HEAT_PUMP_VIABILITY)
+    )[0]
+    return ScenarioSummaries(
+        bers=_to_tidy_counts(
+            pre_retrofit_ber_counts,
+            ber_counts,
+            labels=filter.BER_RATINGS,
+            column="energy_rating",
+        ),
+        heat_pumps=_to_tidy_counts(
+            pre_retrofit_heat_pump_counts,
+            heat_pump_counts,
+            labels=retrofit.HEAT_PUMP_VIABILITY,
+            column="is_viable_for_a_heat_pump",
+        ),
+        costs=_get_costs(buildings, scenarios, ranks, number_selected),
+    )
@@ -0,0 +1,72 @@
+from typing import Dict
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+COMPONENTS = ["roof", "wall", "floor", "window", "door"]
+FLOORS = ["ground", "first", "second", "third"]
+
+# energy values & heat loss parameters stay float64 as they are binned into BER
+# ratings & heat pump viability, float32 rounding could move them across a bin edge
+BUILDING_DTYPES = {
+    "small_area": "category",
+    "energy_rating": "category",
+    "energy_value": "float64",
+    "heat_loss_parameter": "float64",
+    **{f"{floor}_floor_area": "float32" for floor in FLOORS},
+    **{
+        f"{component}_{property}": "float32"
+        for component in COMPONENTS
+        for property in ["area", "uvalue"]
+    },
+}
+BUILDING_COLUMNS = list(BUILDING_DTYPES)
+
+
+def get_arrow_types(dtypes: Dict[str, str] = BUILDING_DTYPES) -> Dict[str, pa.DataType]:
+    """Convert pandas dtypes to the arrow types in which they are stored.
+
+    Categoricals are stored as strings, parquet dictionary encodes them anyway &
+    they are read back as categoricals via `get_categorical_columns`.
+
+    Args:
+        dtypes (Dict[str, str], optional): Pandas dtype of each column.
+            Defaults to BUILDING_DTYPES.
+
+    Returns:
+        Dict[str, pa.DataType]: Arrow type of each column
+    """
+    return {
+        column: (
+            pa.string() if dtype == "category" else pa.from_numpy_dtype(np.dtype(dtype))
+        )
+        for column, dtype in dtypes.items()
+    }
+
+
+def get_categorical_columns(dtypes: Dict[str, str] = BUILDING_DTYPES) -> List[str]:
+    return [column for column, dtype in dtypes.items() if dtype == "category"]
+
+
+def apply_schema(
+    buildings: pd.DataFrame, dtypes: Dict[str, str] = BUILDING_DTYPES
+) -> pd.DataFrame:
+    """Cast each building column present in dtypes to its compact dtype.
+
+    Args:
+        buildings (pd.DataFrame): Buildings
+        dtypes (Dict[str, str], optional): Pandas dtype of each column.
+            Defaults to BUILDING_DTYPES.
+
+    Returns:
+        pd.DataFrame: Buildings with compact dtypes
+    """
+    return buildings.astype(
+        {
+            column: dtype
+            for column, dtype in dtypes.items()
+            if column in buildings.columns and buildings[column].dtype != dtype
+        }
+    )
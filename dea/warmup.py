@@ -0,0 +1,181 @@
+import argparse
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import json
+import logging
+import os
+from pathlib import Path
+from threading import Lock
+import time
+from typing import Any
+from typing import Dict
+from typing import Iterator
+from typing import Mapping
+from typing import Optional
+
+from dea import _DATA_DIR
+from dea import _STATIC_DIR
+from dea import filter
+from dea import io
+
+READINESS_FILENAME = "ready.json"
+
+logger = logging.getLogger(__name__)
+
+# the app's warm up runs on its own thread so it never takes a job worker
+_WARM_UP_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_WARM_UP: Optional[Future] = None
+_WARM_UP_LOCK = Lock()
+
+
+@contextmanager
+def _time_stage(durations: Dict[str, float], stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    yield
+    durations[stage] = round(time.perf_counter() - start, 3)
+
+
+def _write_readiness_file(filepath: Path, durations: Dict[str, float]) -> None:
+    # written to a temporary file & renamed so a health check never reads half
+    temporary_filepath = filepath.with_name(f".{filepath.name}.tmp")
+    with open(temporary_filepath, "w") as f:
+        json.dump({"ready_at": time.time(), "durations": durations}, f, indent=2)
+    os.replace(temporary_filepath, filepath)
+
+
+def is_ready(readiness_filepath: Path = _DATA_DIR / READINESS_FILENAME) -> bool:
+    return Path(readiness_filepath).exists()
+
+
+def warm_up(
+    urls: Optional[Mapping[str, str]] = None,
+    data_dir: Path = _DATA_DIR,
+    static_dir: Path = _STATIC_DIR,
+    defaults: Optional[Dict[str, Any]] = None,
+    readiness_filepath: Optional[Path] = None,
+) -> Dict[str, float]:
+    """Fetch data & fill the caches the first visitor would otherwise wait on.
+
+    The BER parquet & small area boundaries are downloaded into data_dir, the map
+    layer is built into static_dir, the building stock is loaded with its
+    retrofit columns & the app's default retrofit is summarised into the results
+    cache on disk. In-process caches are only warmed in this process, see
+    `start_warm_up` for the app's own.
+
+    Args:
+        urls (Optional[Mapping[str, str]], optional): Locations of the bers &
+            small_area_boundaries. Defaults to None, which reads CONFIG["urls"].
+        data_dir (Path, optional): Directory in which downloads & results are
+            cached. Defaults to _DATA_DIR.
+        static_dir (Path, optional): Directory served by streamlit as app/static.
+            Defaults to _STATIC_DIR.
+        defaults (Optional[Dict[str, Any]], optional): Retrofit properties
+            selected by default in the app. Defaults to None, which reads
+            DEFAULTS.
+        readiness_filepath (Optional[Path], optional): File written once warm,
+            & removed at the start, for a health check to test. Defaults to None.
+
+    Returns:
+        Dict[str, float]: Duration [s] of each stage
+    """
+    if urls is None:
+        from dea import CONFIG
+
+        urls = CONFIG["urls"]
+    if defaults is None:
+        from dea import DEFAULTS
+
+        defaults = DEFAULTS
+    if readiness_filepath is not None:
+        Path(readiness_filepath).unlink(missing_ok=True)
+    data_dir = Path(data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    durations: Dict[str, float] = {}
+    with _time_stage(durations, "fetch"):
+        for url in urls.values():
+            io._fetch(url, data_dir=data_dir, filesystem_name="s3")
+    with _time_stage(durations, "map_layer"):
+        map_layer = io.load_map_layer(
+            urls["small_area_boundaries"], data_dir=data_dir, static_dir=static_dir
+        )
+    with _time_stage(durations, "buildings"):
+        io.load_buildings(url=urls["bers"], data_dir=data_dir)
+    with _time_stage(durations, "default_retrofit"):
+        # as submitted by the app before anything is changed
+        io.load_retrofit_summary(
+            url=urls["bers"],
+            data_dir=data_dir,
+            selected_energy_ratings=filter.ENERGY_RATINGS,
+            selected_small_areas=map_layer.points["small_area"].to_list(),
+            selections=defaults,
+        )
+
+    if readiness_filepath is not None:
+        _write_readiness_file(Path(readiness_filepath), durations)
+    return durations
+
+
+def _warm_up_and_log_failures(data_dir: Path, static_dir: Path) -> Dict[str, float]:
+    # the readiness file is left to `python -m dea.warmup`, as removing it at the
+    # start would fail the health check of an instance already serving visitors
+    try:
+        return warm_up(data_dir=data_dir, static_dir=static_dir)
+    except Exception:
+        logger.exception("Warm up failed, it is retried by the next session")
+        raise
+
+
+def start_warm_up(data_dir: Path, static_dir: Path) -> Future:
+    """Warm up the caches of this process in the background, once per process.
+
+    The warm up runs on its own thread rather than the job manager's so it never
+    delays the retrofits of visitors, & leaves the readiness file alone. A
+    failed warm up is logged & started again by the next call.
+
+    Args:
+        data_dir (Path): Directory in which downloads & results are cached
+        static_dir (Path): Directory served by streamlit as app/static
+
+    Returns:
+        Future: Handle on the warm up, whose result is the duration of each stage
+    """
+    global _WARM_UP_EXECUTOR, _WARM_UP
+    with _WARM_UP_LOCK:
+        if _WARM_UP_EXECUTOR is None:
+            _WARM_UP_EXECUTOR = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="dea-warm-up"
+            )
+        has_failed = (
+            _WARM_UP is not None
+            and _WARM_UP.done()
+            and _WARM_UP.exception() is not None
+        )
+        if _WARM_UP is None or has_failed:
+            _WARM_UP = _WARM_UP_EXECUTOR.submit(
+                _warm_up_and_log_failures, data_dir=data_dir, static_dir=static_dir
+            )
+        return _WARM_UP
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Fetch data & fill caches before the app serves traffic"
+    )
+    parser.add_argument("--data-dir", type=Path, default=_DATA_DIR)
+    parser.add_argument("--static-dir", type=Path, default=_STATIC_DIR)
+    parser.add_argument(
+        "--readiness-file",
+        type=Path,
+        default=None,
+        help=f"Defaults to {READINESS_FILENAME} in the data directory",
+    )
+
+    args = parser.parse_args()
+    durations = warm_up(
+        data_dir=args.data_dir,
+        static_dir=args.static_dir,
+        readiness_filepath=args.readiness_file or args.data_dir / READINESS_FILENAME,
+    )
+    print(json.dumps(durations, indent=2))
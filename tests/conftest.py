@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def buildings() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    size = 200
+    small_areas = [f"2670{i:05d}" for i in range(10)]
+    energy_ratings = ["A1", "A2", "B1", "C2", "D1", "D2", "E1", "F", "G"]
+    uvalues = {
+        "roof": [0.13, 0.4, 2.3],
+        "wall": [0.21, 0.6, 2.1],
+        "floor": [0.25, 0.6],
+        "window": [1.4, 2.8, 4.8],
+        "door": [1.5, 3.0],
+    }
+    return pd.DataFrame(
+        {
+            "small_area": rng.choice(small_areas, size=size),
+            "energy_rating": rng.choice(energy_ratings, size=size),
+            "energy_value": rng.uniform(20, 600, size=size),
+            "heat_loss_parameter": rng.uniform(0.8, 4, size=size),
+            "ground_floor_area": rng.uniform(30, 90, size=size),
+            "first_floor_area": rng.uniform(0, 90, size=size),
+            "second_floor_area": np.zeros(size),
+            "third_floor_area": np.zeros(size),
+            "roof_area": rng.uniform(30, 90, size=size),
+            "roof_uvalue": rng.choice(uvalues["roof"], size=size),
+            "wall_area": rng.uniform(50, 150, size=size),
+            "wall_uvalue": rng.choice(uvalues["wall"], size=size),
+            "floor_area": rng.uniform(30, 90, size=size),
+            "floor_uvalue": rng.choice(uvalues["floor"], size=size),
+            "window_area": rng.uniform(5, 30, size=size),
+            "window_uvalue": rng.choice(uvalues["window"], size=size),
+            "door_area": rng.uniform(1.5, 2.5, size=size),
+            "door_uvalue": rng.choice(uvalues["door"], size=size),
+            "year_of_construction": rng.integers(1900, 2020, size=size),
+        }
+    )
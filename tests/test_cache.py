@@ -0,0 +1,62 @@
+import os
+
+import pandas as pd
+
+from dea import cache
+
+
+def test_lru_cache_evicts_least_recently_used_within_budget():
+    frame = pd.DataFrame({"a": range(100)})
+    nbytes = cache.get_nbytes(frame)
+    lru_cache = cache.LRUCache(max_bytes=2 * nbytes)
+
+    lru_cache.put("first", frame)
+    lru_cache.put("second", frame.copy())
+    assert lru_cache.get("first") is frame
+    lru_cache.put("third", frame.copy())
+
+    assert lru_cache.get("second") is None
+    assert lru_cache.get("first") is frame
+    assert lru_cache.cache_info() == cache.CacheInfo(
+        hits=2,
+        misses=1,
+        evictions=1,
+        entries=2,
+        nbytes=2 * nbytes,
+        max_bytes=2 * nbytes,
+    )
+
+
+def test_lru_cache_skips_values_over_budget():
+    lru_cache = cache.LRUCache(max_bytes=10)
+
+    lru_cache.put("large", pd.DataFrame({"a": range(100)}))
+
+    assert lru_cache.get("large") is None
+    assert lru_cache.cache_info().entries == 0
+
+
+def test_disk_cache_roundtrips_and_evicts_least_recently_used(tmp_path):
+    frames = {"counts": pd.DataFrame({"a": range(1000)})}
+    disk_cache = cache.DiskCache(tmp_path, max_bytes=10**9)
+    disk_cache.put("first", frames)
+    nbytes = sum(path.stat().st_size for path in (tmp_path / "first").iterdir())
+    disk_cache.max_bytes = 2 * nbytes
+
+    disk_cache.put("second", frames)
+    os.utime(tmp_path / "first", (0, 0))
+    disk_cache.put("third", frames)
+
+    assert disk_cache.get("first") is None
+    pd.testing.assert_frame_equal(disk_cache.get("third")["counts"], frames["counts"])
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["second", "third"]
+
+
+def test_disk_cache_keeps_the_first_of_concurrent_writes(tmp_path):
+    disk_cache = cache.DiskCache(tmp_path, max_bytes=10**9)
+
+    disk_cache.put("key", {"counts": pd.DataFrame({"a": [1]})})
+    disk_cache.put("key", {"counts": pd.DataFrame({"a": [2]})})
+
+    assert disk_cache.get("key")["counts"]["a"].tolist() == [1]
+    assert [path.name for path in tmp_path.iterdir()] == ["key"]
@@ -0,0 +1,170 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+import pyarrow.parquet as pq
+import pytest
+
+from dea import convert
+from dea import io
+from dea import schema
+
+
+@pytest.fixture
+def dataset_dir(buildings: pd.DataFrame, tmp_path: Path) -> Path:
+    buildings = buildings.copy()
+    buildings.loc[0, "energy_rating"] = None
+    buildings.to_parquet(tmp_path / "bers.parquet")
+    convert.convert_parquet_to_dataset(
+        tmp_path / "bers.parquet", tmp_path / "bers", row_group_size=16
+    )
+    return tmp_path / "bers"
+
+
+def _sort(buildings: pd.DataFrame) -> pd.DataFrame:
+    return (
+        buildings.astype({"small_area": "object", "energy_rating": "object"})
+        .sort_values(["small_area", "energy_value"])
+        .reset_index(drop=True)
+    )
+
+
+def test_convert_parquet_to_dataset_writes_manifest(buildings, dataset_dir):
+    manifest = convert.read_manifest(dataset_dir)
+
+    assert manifest["num_rows"] == len(buildings)
+    assert [p["energy_rating"] for p in manifest["partitions"]] == [
+        "A1",
+        "A2",
+        "B1",
+        "C2",
+        "D1",
+        "D2",
+        "E1",
+        "F",
+        "G",
+        None,
+    ]
+    for partition in manifest["partitions"]:
+        assert (dataset_dir / partition["path"]).exists()
+
+
+@pytest.mark.parametrize(
+    "selected_energy_ratings,selected_small_areas",
+    [
+        (["D", "G"], ["267000001", "267000002"]),
+        (["A"], ["267000009"]),
+        (["A", "B", "C", "D", "E", "F", "G"], None),
+        (["A"], ["999999999"]),
+    ],
+)
+def test_read_buildings_dataset_matches_parquet(
+    dataset_dir, tmp_path, selected_energy_ratings, selected_small_areas
+):
+    output = io.read_buildings_dataset(
+        dataset_dir,
+        selected_energy_ratings=selected_energy_ratings,
+        selected_small_areas=selected_small_areas,
+        columns=schema.BUILDING_COLUMNS,
+    )
+
+    expected_output = io._load_buildings(
+        url="s3://codema-dev/views/bers.parquet",
+        data_dir=tmp_path,
+        columns=schema.BUILDING_COLUMNS,
+        filters=io._get_parquet_filters(
+            selected_energy_ratings=selected_energy_ratings,
+            selected_small_areas=selected_small_areas,
+        ),
+    )
+    assert list(output.columns) == schema.BUILDING_COLUMNS
+    assert_frame_equal(_sort(output), _sort(expected_output))
+
+
+def test_get_selected_partitions_skips_untouched_partitions(dataset_dir):
+    manifest = convert.read_manifest(dataset_dir)
+    manifest["partitions"][0]["small_area_min"] = "267000005"
+    manifest["partitions"][0]["small_area_max"] = "267000006"
+
+    output = io._get_selected_partitions(
+        manifest,
+        selected_energy_ratings=["A"],
+        selected_small_areas=["267000001", "267000009"],
+    )
+
+    assert "A1" not in [p["energy_rating"] for p in output]
+    assert np.all([p["energy_rating"].startswith("A") for p in output])
+
+
+@pytest.fixture
+def bers_csv(buildings: pd.DataFrame, tmp_path: Path) -> Path:
+    buildings = buildings.copy()
+    buildings.loc[150, "third_floor_area"] = np.nan
+    buildings.loc[180, "small_area"] = np.nan
+    buildings.to_csv(tmp_path / "bers.csv", index=False)
+    return tmp_path / "bers.csv"
+
+
+@pytest.mark.parametrize(
+    "drop_option,dropna_kwargs",
+    [("row", {"axis": 0}), ("column", {"axis": 1}), (None, None)],
+)
+def test_convert_csv_to_parquet_matches_pandas(
+    bers_csv, tmp_path, drop_option, dropna_kwargs
+):
+    num_rows = convert.convert_csv_to_parquet(
+        bers_csv, tmp_path / "bers.parquet", drop_option=drop_option, block_size=4096
+    )
+
+    output = pd.read_parquet(tmp_path / "bers.parquet")
+    # columns without a declared type are stored as strings
+    expected_output = pd.read_csv(
+        bers_csv,
+        dtype={
+            column: str
+            for column in pd.read_csv(bers_csv, nrows=0).columns
+            if column not in convert.DOWNCAST_TYPES or column == "small_area"
+        },
+    )
+    if dropna_kwargs is not None:
+        expected_output = expected_output.dropna(**dropna_kwargs)
+    assert num_rows == len(expected_output)
+    assert pq.ParquetFile(tmp_path / "bers.parquet").num_row_groups > 1
+    assert list(output.columns) == list(expected_output.columns)
+    assert_frame_equal(
+        output.reset_index(drop=True),
+        expected_output.reset_index(drop=True),
+        check_dtype=False,
+        atol=1e-4,
+    )
+
+
+@pytest.mark.parametrize("drop_option", ["row", "column", None])
+def test_convert_csv_to_parquet_reads_columns_empty_in_the_first_block(
+    tmp_path, drop_option
+):
+    sparse = pd.DataFrame(
+        {
+            "small_area": ["267000001"] * 5001,
+            "energy_value": [100.0] * 5001,
+            "comment": [np.nan] * 5000 + ["x"],
+        }
+    )
+    sparse.to_csv(tmp_path / "sparse.csv", index=False)
+
+    num_rows = convert.convert_csv_to_parquet(
+        tmp_path / "sparse.csv",
+        tmp_path / "sparse.parquet",
+        drop_option=drop_option,
+        block_size=4096,
+    )
+
+    output = pd.read_parquet(tmp_path / "sparse.parquet")
+    if drop_option == "column":
+        assert list(output.columns) == ["small_area", "energy_value"]
+    elif drop_option == "row":
+        assert output["comment"].tolist() == ["x"]
+    else:
+        assert output["comment"].iloc[-1] == "x"
+    assert num_rows == len(output)
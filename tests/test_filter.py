@@ -1,4 +1,3 @@
-import icontract
 import numpy as np
 import pandas as pd
 from pandas.testing import assert_frame_equal
@@ -7,50 +6,108 @@ import pytest
 from dea import filter
 
 
+@pytest.fixture
+def small_buildings() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "small_area": ["267001002", "267001001", np.nan, "267001002", "267001003"],
+            "energy_rating": ["G", "A1", "C2", "B3", "G"],
+            "wall_uvalue": [2.1, 0.2, 0.6, 0.3, 2.1],
+        }
+    )
+
+
+def test_expand_energy_ratings():
+    assert filter.expand_energy_ratings(["A", "E"]) == ["A1", "A2", "A3", "E1", "E2"]
+
+
+def test_get_small_area_offsets(small_buildings):
+    indexed_buildings = filter.index_by_small_area(small_buildings)
+    output = filter.get_small_area_offsets(indexed_buildings["small_area"])
+    np.testing.assert_array_equal(output, [1, 2, 4, 5])
+
+
+@pytest.mark.parametrize("use_offsets", [True, False])
 @pytest.mark.parametrize(
-    "bers,selected_postcodes,counties,expected_output",
+    "selected_energy_ratings,selected_small_areas,expected_wall_uvalues",
     [
-        (
-            pd.DataFrame({"countyname": ["DUBLIN 11", "CO. GALWAY", "CO. CORK"]}),
-            ["Dublin 11"],
-            ["Dublin", "Galway", "Cork"],
-            pd.DataFrame({"countyname": ["DUBLIN 11"]}),
-        ),
-        (
-            pd.DataFrame({"countyname": ["Dublin", "Galway", "Cork"]}),
-            ["Dublin", "Galway", "Cork"],
-            ["Dublin", "Galway", "Cork"],
-            pd.DataFrame(
-                {
-                    "countyname": ["Dublin", "Galway", "Cork"],
-                }
-            ),
-        ),
+        (["A", "B", "C", "D", "E", "F", "G"], ["267001002"], [2.1, 0.3]),
+        (["G"], ["267001002", "267001003"], [2.1, 2.1]),
+        (["A", "B"], ["267001001", "267001002", "267001003"], [0.2, 0.3]),
+        (["A", "B", "C", "D", "E", "F", "G"], ["26700100"], []),
     ],
 )
-def test_filter_by_substrings(
-    bers,
-    selected_postcodes,
-    counties,
-    expected_output,
+def test_get_selected_buildings_matches_exactly(
+    small_buildings,
+    use_offsets,
+    selected_energy_ratings,
+    selected_small_areas,
+    expected_wall_uvalues,
 ):
-    output = filter.filter_by_substrings(
-        df=bers,
-        column_name="countyname",
-        selected_substrings=selected_postcodes,
-        all_substrings=counties,
+    indexed_buildings = filter.index_by_small_area(small_buildings)
+    if use_offsets:
+        small_area_offsets = filter.get_small_area_offsets(
+            indexed_buildings["small_area"]
+        )
+    else:
+        small_area_offsets = None
+
+    if expected_wall_uvalues:
+        output = filter.get_selected_buildings(
+            indexed_buildings,
+            selected_energy_ratings=selected_energy_ratings,
+            selected_small_areas=selected_small_areas,
+            small_area_offsets=small_area_offsets,
+        )
+        assert sorted(output["wall_uvalue"]) == sorted(expected_wall_uvalues)
+    else:
+        with pytest.raises(ValueError):
+            filter.get_selected_buildings(
+                indexed_buildings,
+                selected_energy_ratings=selected_energy_ratings,
+                selected_small_areas=selected_small_areas,
+                small_area_offsets=small_area_offsets,
+            )
+
+
+def test_get_selected_buildings_excludes_missing_small_areas(small_buildings):
+    output = filter.get_selected_buildings(
+        small_buildings,
+        selected_energy_ratings=["A", "B", "C", "D", "E", "F", "G"],
+        selected_small_areas=["267001001", "267001002", "267001003"],
+    )
+    assert output["small_area"].notna().all()
+    assert len(output) == 4
+
+
+def test_get_selected_buildings_with_offsets_matches_mask(buildings):
+    indexed_buildings = filter.index_by_small_area(buildings)
+    small_area_offsets = filter.get_small_area_offsets(indexed_buildings["small_area"])
+    selected_small_areas = ["267000001", "267000005", "267000009"]
+
+    output = filter.get_selected_buildings(
+        indexed_buildings,
+        selected_energy_ratings=["D", "G"],
+        selected_small_areas=selected_small_areas,
+        small_area_offsets=small_area_offsets,
     )
+
+    expected_output = indexed_buildings[
+        indexed_buildings["small_area"].isin(selected_small_areas)
+        & indexed_buildings["energy_rating"].isin(["D1", "D2", "G"])
+    ].reset_index(drop=True)
     assert_frame_equal(output, expected_output)
 
 
-def test_filter_by_substrings_raises_error_if_nan_values():
-    bers = pd.DataFrame({"countyname": [np.nan, "CO. GALWAY", "CO. CORK"]})
-    selected_substrings = ["Dublin 11"]
-    counties = ["Dublin", "Galway", "Cork"]
-    with pytest.raises(icontract.ViolationError):
-        filter.filter_by_substrings(
-            df=bers,
-            column_name="countyname",
-            selected_substrings=selected_substrings,
-            all_substrings=counties,
-        )
+def test_get_selected_buildings_shares_memory_if_all_are_selected(buildings):
+    output = filter.get_selected_buildings(
+        buildings,
+        selected_energy_ratings=filter.ENERGY_RATINGS,
+        selected_small_areas=None,
+    )
+
+    assert output is not buildings
+    assert np.shares_memory(
+        output["wall_uvalue"].to_numpy(), buildings["wall_uvalue"].to_numpy()
+    )
+    assert_frame_equal(output, buildings.reset_index(drop=True))
@@ -0,0 +1,81 @@
+from pathlib import Path
+import subprocess
+import sys
+from typing import Dict
+from typing import Tuple
+
+import dea
+
+# cumulative time to cold import dea, well above the few ms it takes so that
+# only a regression such as an eager import of pandas fails
+IMPORT_TIME_BUDGET_US = 50_000
+# likewise for the batch modules, most of whose time is pandas & pyarrow
+BATCH_IMPORT_TIME_BUDGET_US = 2_000_000
+SLOW_IMPORTS = ["altair", "bokeh", "geopandas", "shapely", "streamlit"]
+# the app needs streamlit at once but its map only once a session renders it
+MAP_IMPORTS = ["bokeh", "geopandas", "shapely"]
+
+
+def _run_python(code: str, *options: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *options, "-c", code],
+        cwd=Path(dea.__file__).parent.parent,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def _get_import_times(code: str) -> Dict[str, Tuple[int, int]]:
+    output = _run_python(code, "-X", "importtime")
+    # lines are "import time: self [us] | cumulative [us] | module"
+    return {
+        line.split("|")[2].strip(): (
+            int(line.split("|")[0].split(":")[1]),
+            int(line.split("|")[1]),
+        )
+        for line in output.stderr.splitlines()
+        if line.startswith("import time:") and "cumulative" not in line
+    }
+
+
+def test_cold_import_of_dea_is_within_budget():
+    import_times = _get_import_times("import dea")
+
+    _, cumulative_time = import_times["dea"]
+    assert cumulative_time < IMPORT_TIME_BUDGET_US
+    assert "pandas" not in import_times
+
+
+def test_cold_import_of_batch_modules_is_within_budget():
+    import_times = _get_import_times("import dea.main, dea.io, dea.warmup")
+
+    total_time = sum(self_time for self_time, _ in import_times.values())
+    assert total_time < BATCH_IMPORT_TIME_BUDGET_US
+
+
+def test_batch_modules_do_not_read_config_on_import():
+    output = _run_python(
+        "import dea, dea.main, dea.io, dea.warmup; "
+        "print([name for name in ['CONFIG', 'DEFAULTS'] if name in vars(dea)])"
+    )
+
+    assert output.stdout.strip() == "[]"
+
+
+def test_batch_modules_do_not_import_app_dependencies():
+    output = _run_python(
+        "import sys; import dea.main, dea.io, dea.warmup; "
+        f"print(','.join(m for m in {SLOW_IMPORTS!r} if m in sys.modules))"
+    )
+
+    assert output.stdout.strip() == ""
+
+
+def test_app_does_not_import_map_dependencies():
+    output = _run_python(
+        "import sys; import app; "
+        f"print(','.join(m for m in {MAP_IMPORTS!r} if m in sys.modules))"
+    )
+
+    assert output.stdout.strip() == ""
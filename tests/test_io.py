@@ -0,0 +1,264 @@
+import os
+from pathlib import Path
+import threading
+
+import pandas as pd
+import pytest
+
+from dea import convert
+from dea import io
+from dea import jobs
+from dea import schema
+
+
+@pytest.fixture
+def bers_url(buildings: pd.DataFrame, tmp_path: Path) -> str:
+    buildings.to_parquet(tmp_path / "bers.parquet")
+    return "s3://codema-dev/views/bers.parquet"
+
+
+def test_get_parquet_filters_skips_energy_rating_when_all_selected():
+    filters = io._get_parquet_filters(
+        selected_energy_ratings=["A", "B", "C", "D", "E", "F", "G"],
+        selected_small_areas=["267000001"],
+    )
+    assert filters == [("small_area", "in", ["267000001"])]
+
+
+def test_load_buildings_reads_only_selected_rows_and_columns(
+    buildings, bers_url, tmp_path
+):
+    filters = io._get_parquet_filters(
+        selected_energy_ratings=["D", "G"],
+        selected_small_areas=["267000001", "267000002"],
+    )
+    output = io._load_buildings(
+        url=bers_url,
+        data_dir=tmp_path,
+        columns=schema.BUILDING_COLUMNS,
+        filters=filters,
+    )
+    expected_output = buildings.pipe(schema.apply_schema).loc[
+        buildings["energy_rating"].isin(["D1", "D2", "G"])
+        & buildings["small_area"].isin(["267000001", "267000002"]),
+        schema.BUILDING_COLUMNS,
+    ].reset_index(drop=True)
+    assert list(output.columns) == schema.BUILDING_COLUMNS
+    pd.testing.assert_frame_equal(
+        output.reset_index(drop=True), expected_output, check_categorical=False
+    )
+
+
+def test_load_selected_buildings_does_not_modify_shared_buildings(
+    buildings, bers_url, tmp_path
+):
+    io.load_buildings.clear()
+    all_buildings = io.load_buildings(url=bers_url, data_dir=tmp_path)
+    before = all_buildings.copy()
+
+    selected = io.load_selected_buildings(
+        url=bers_url,
+        data_dir=tmp_path,
+        selected_energy_ratings=["G"],
+        selected_small_areas=["267000001"],
+    )
+    selected["wall_uvalue"] = 0
+
+    pd.testing.assert_frame_equal(all_buildings, before)
+
+
+def test_read_selected_buildings_matches_load_selected_buildings(bers_url, tmp_path):
+    io.load_buildings.clear()
+    kwargs = dict(
+        url=bers_url,
+        data_dir=tmp_path,
+        selected_energy_ratings=["D", "E"],
+        selected_small_areas=["267000003", "267000004"],
+    )
+    pd.testing.assert_frame_equal(
+        io.read_selected_buildings(**kwargs),
+        io.load_selected_buildings(**kwargs),
+        check_categorical=False,
+    )
+
+
+def test_load_selected_buildings_caches_by_selection_not_its_order(bers_url, tmp_path):
+    io.load_buildings.clear()
+    io.get_selected_buildings_cache().clear()
+    before = io.get_selected_buildings_cache().cache_info()
+
+    first = io.load_selected_buildings(
+        url=bers_url,
+        data_dir=tmp_path,
+        selected_energy_ratings=["D", "E"],
+        selected_small_areas=["267000003", "267000004"],
+    )
+    second = io.load_selected_buildings(
+        url=bers_url,
+        data_dir=tmp_path,
+        selected_energy_ratings=["E", "D"],
+        selected_small_areas=["267000004", "267000003", "267000004"],
+    )
+
+    after = io.get_selected_buildings_cache().cache_info()
+    assert second is first
+    assert after.misses - before.misses == 1
+    assert after.hits - before.hits == 1
+
+
+def test_load_retrofit_summary_is_cached_on_disk(bers_url, tmp_path):
+    io.load_buildings.clear()
+    selections = {
+        "wall": {
+            "uvalue": {"target": 0.2, "threshold": 0.5},
+            "cost": {"lower": 50, "upper": 300},
+            "percentage_selected": 0.5,
+        },
+    }
+    kwargs = dict(
+        url=bers_url,
+        data_dir=tmp_path,
+        selected_energy_ratings=["D", "E"],
+        selected_small_areas=["267000003", "267000004"],
+        selections=selections,
+    )
+
+    computed = io.load_retrofit_summary(**kwargs)
+    cached = io.load_retrofit_summary(**kwargs)
+
+    assert len(list((tmp_path / "results").iterdir())) == 1
+    pd.testing.assert_frame_equal(cached.bers, computed.bers)
+    pd.testing.assert_frame_equal(cached.heat_pumps, computed.heat_pumps)
+    pd.testing.assert_frame_equal(cached.costs, computed.costs)
+
+
+def test_load_retrofit_summary_hits_the_disk_cache_without_loading_buildings(
+    bers_url, tmp_path, monkeypatch
+):
+    io.load_buildings.clear()
+    kwargs = dict(
+        url=bers_url,
+        data_dir=tmp_path,
+        selected_energy_ratings=["D", "E"],
+        selected_small_areas=["267000003", "267000004"],
+        selections={
+            "wall": {
+                "uvalue": {"target": 0.2, "threshold": 0.5},
+                "cost": {"lower": 50, "upper": 300},
+                "percentage_selected": 0.5,
+            },
+        },
+    )
+    computed = io.load_retrofit_summary(**kwargs)
+
+    def _fail(*args, **kwargs):
+        raise AssertionError("buildings were loaded")
+
+    monkeypatch.setattr(io, "load_buildings", _fail)
+    cached = io.load_retrofit_summary(
+        **{**kwargs, "selected_energy_ratings": ["E", "D"]}
+    )
+
+    pd.testing.assert_frame_equal(cached.costs, computed.costs)
+
+
+def test_load_retrofit_summary_reports_progress_to_its_job(bers_url, tmp_path):
+    io.load_buildings.clear()
+    job = jobs.Job()
+
+    summary = io.load_retrofit_summary(
+        url=bers_url,
+        data_dir=tmp_path,
+        selected_energy_ratings=["D", "E"],
+        selected_small_areas=["267000003", "267000004"],
+        selections={
+            "wall": {
+                "uvalue": {"target": 0.2, "threshold": 0.5},
+                "cost": {"lower": 50, "upper": 300},
+                "percentage_selected": 0.5,
+            },
+        },
+        job=job,
+    )
+
+    status = job.status()
+    assert status.stage == "summarising"
+    assert list(status.results) == ["bers", "heat_pumps", "costs"]
+    pd.testing.assert_frame_equal(status.results["costs"], summary.costs)
+
+
+def test_read_selected_buildings_skips_a_dataset_of_an_old_parquet(
+    buildings, bers_url, tmp_path
+):
+    convert.convert_parquet_to_dataset(tmp_path / "bers.parquet", tmp_path / "bers")
+    updated_buildings = buildings.assign(energy_value=buildings["energy_value"] + 1)
+    updated_buildings.to_parquet(tmp_path / "bers.parquet")
+    os.utime(tmp_path / "bers.parquet", (0, 0))
+
+    output = io.read_selected_buildings(
+        url=bers_url,
+        data_dir=tmp_path,
+        selected_energy_ratings=["D", "E"],
+        selected_small_areas=["267000003", "267000004"],
+    )
+
+    expected_energy_values = updated_buildings.loc[
+        updated_buildings["energy_rating"].isin(["D1", "D2", "E1"])
+        & updated_buildings["small_area"].isin(["267000003", "267000004"]),
+        "energy_value",
+    ]
+    assert sorted(output["energy_value"]) == pytest.approx(
+        sorted(expected_energy_values)
+    )
+
+
+def test_submit_retrofit_summary_selects_all_small_areas_by_default(
+    buildings, bers_url, tmp_path
+):
+    io.load_buildings.clear()
+
+    job = io.submit_retrofit_summary(
+        url=bers_url,
+        data_dir=tmp_path,
+        selected_energy_ratings=["D", "E"],
+        selected_small_areas=None,
+        selections={},
+    )
+
+    summary = job.result(timeout=60)
+    number_of_buildings = buildings["energy_rating"].isin(["D1", "D2", "E1"]).sum()
+    assert summary.bers.query("category == 'Pre'")["total"].sum() == (
+        number_of_buildings
+    )
+
+
+def test_submit_retrofit_summary_shares_jobs_of_equal_numbers(
+    bers_url, tmp_path, monkeypatch
+):
+    io.load_buildings.clear()
+    manager = jobs.JobManager(max_workers=1)
+    monkeypatch.setattr(jobs, "get_job_manager", lambda: manager)
+    # hold the only worker so the first job is still queued when resubmitted
+    release = threading.Event()
+    manager.submit("blocker", lambda job: release.wait())
+    selections = {
+        "wall": {
+            "uvalue": {"target": 0.2, "threshold": 0.5},
+            "cost": {"lower": 50, "upper": 300},
+            "percentage_selected": 1,
+        },
+    }
+    kwargs = dict(
+        url=bers_url,
+        data_dir=tmp_path,
+        selected_energy_ratings=["D", "E"],
+        selected_small_areas=None,
+    )
+
+    first = io.submit_retrofit_summary(**kwargs, selections=selections)
+    second = io.submit_retrofit_summary(**kwargs, selections=io._as_floats(selections))
+    release.set()
+
+    assert second is first
+    first.result(timeout=60)
+    manager.shutdown()
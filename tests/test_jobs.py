@@ -0,0 +1,48 @@
+from threading import Event
+
+import pytest
+
+from dea import jobs
+
+
+def test_job_manager_shares_running_jobs_with_the_same_key():
+    manager = jobs.JobManager(max_workers=2)
+    release = Event()
+    calls = []
+
+    def compute(job):
+        calls.append(job.key)
+        job.set_stage("retrofitting")
+        job.set_result("bers", 1)
+        release.wait(timeout=5)
+        return 2
+
+    job = manager.submit("key", compute)
+    duplicate = manager.submit("key", compute)
+    other = manager.submit("other", compute)
+    release.set()
+
+    assert duplicate is job
+    assert other is not job
+    assert job.result(timeout=5) == 2
+    assert sorted(calls) == ["key", "other"]
+    status = job.status()
+    assert status.stage == "done"
+    assert status.results == {"bers": 1}
+    assert status.done and status.fraction_complete == 1
+    assert manager.submit("key", compute) is not job
+    manager.shutdown()
+
+
+def test_job_manager_raises_errors_on_result():
+    manager = jobs.JobManager(max_workers=1)
+
+    def fail(job):
+        raise ValueError("No buildings selected")
+
+    job = manager.submit("key", fail)
+
+    with pytest.raises(ValueError):
+        job.result(timeout=5)
+    assert job.status().done
+    manager.shutdown()
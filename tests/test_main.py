@@ -0,0 +1,91 @@
+import json
+
+import pandas as pd
+import pytest
+
+from dea import DEFAULTS
+from dea import main
+
+
+def test_run_scenario_file_writes_named_summaries(buildings, tmp_path):
+    buildings.to_parquet(tmp_path / "bers.parquet")
+    scenario_file = {
+        "selected_energy_ratings": ["D", "E", "F", "G"],
+        "scenarios": {
+            "none": {},
+            "walls": {"wall": {"percentage_selected": 0.5}},
+        },
+    }
+    with open(tmp_path / "scenarios.json", "w") as f:
+        json.dump(scenario_file, f)
+
+    main.main(
+        [
+            str(tmp_path / "scenarios.json"),
+            str(tmp_path / "output"),
+            "--bers",
+            str(tmp_path / "bers.parquet"),
+            "--format",
+            "csv",
+        ]
+    )
+
+    costs = pd.read_csv(tmp_path / "output" / "costs.csv")
+    assert costs["scenario"].tolist() == ["none", "walls"]
+    assert costs.loc[0, "wall_cost_lower"] == 0
+    assert costs.loc[1, "wall_cost_lower"] > 0
+    bers = pd.read_csv(tmp_path / "output" / "bers.csv")
+    assert set(bers["scenario"]) == {"none", "walls"}
+    assert (tmp_path / "output" / "heat_pumps.csv").exists()
+
+
+def test_read_scenario_file_fills_in_defaults(tmp_path):
+    with open(tmp_path / "scenarios.json", "w") as f:
+        json.dump({"scenarios": {"roofs": {"roof": {"uvalue": {"target": 0.1}}}}}, f)
+
+    scenario_file = main.read_scenario_file(tmp_path / "scenarios.json")
+
+    roofs = scenario_file["scenarios"]["roofs"]
+    assert roofs["roof"]["uvalue"] == {"target": 0.1, "threshold": 0.5}
+    assert roofs["wall"] == DEFAULTS["wall"]
+    assert scenario_file["selected_small_areas"] is None
+
+
+def test_read_scenario_file_rejects_scenarios_of_different_components(tmp_path):
+    scenario_file = {
+        "scenarios": {
+            "none": {},
+            "floors": {"floor": {"percentage_selected": 0.5}},
+        }
+    }
+    with open(tmp_path / "scenarios.json", "w") as f:
+        json.dump(scenario_file, f)
+
+    with pytest.raises(ValueError, match="same components"):
+        main.read_scenario_file(tmp_path / "scenarios.json")
+
+
+def test_run_scenario_file_writes_percentiles_over_draws(buildings, tmp_path):
+    buildings.to_parquet(tmp_path / "bers.parquet")
+    scenario_file = {
+        "number_of_draws": 10,
+        "scenarios": {"walls": {"wall": {"percentage_selected": 0.5}}},
+    }
+    with open(tmp_path / "scenarios.json", "w") as f:
+        json.dump(scenario_file, f)
+
+    main.main(
+        [
+            str(tmp_path / "scenarios.json"),
+            str(tmp_path / "output"),
+            "--bers",
+            str(tmp_path / "bers.parquet"),
+        ]
+    )
+
+    costs = pd.read_parquet(tmp_path / "output" / "costs_percentiles.parquet")
+    assert costs["quantile"].tolist() == [0.05, 0.5, 0.95]
+    assert costs["scenario"].astype(str).unique().tolist() == ["walls"]
+    assert costs["total_cost_lower"].is_monotonic_increasing
+    assert (tmp_path / "output" / "bers_percentiles.parquet").exists()
+    assert (tmp_path / "output" / "heat_pumps_percentiles.parquet").exists()
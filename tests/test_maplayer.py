@@ -0,0 +1,93 @@
+import json
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import Polygon
+from shapely.geometry import box
+
+from dea import maplayer
+
+
+def _create_boundaries():
+    return gpd.GeoDataFrame(
+        {"small_area": ["267001001", "267001002", "267001003"]},
+        geometry=[
+            box(715000 + 3000 * i, 734000, 717500 + 3000 * i, 734400) for i in range(3)
+        ],
+        crs="EPSG:2157",
+    )
+
+
+def test_map_layer_roundtrips(tmp_path):
+    output = maplayer.create_map_layer(_create_boundaries(), epsg="3857")
+    maplayer.write_map_layer(output, tmp_path)
+
+    layer = maplayer.read_map_layer(tmp_path)
+    assert layer.geojson == output.geojson
+    assert layer.tile_index == output.tile_index
+    assert len(json.loads(layer.geojson)["features"]) == 3
+    assert list(layer.points.columns) == ["small_area", "x", "y"]
+    assert layer.points["x"].between(-7e5, -6e5).all()
+
+
+def test_map_layer_tiles_cover_every_boundary_at_every_level(tmp_path):
+    output = maplayer.create_map_layer(_create_boundaries(), epsg="3857")
+    maplayer.write_map_layer(output, tmp_path)
+
+    levels = output.tile_index["levels"]
+    assert len(levels) == len(maplayer.LEVELS_OF_DETAIL)
+    assert levels[0]["tiles"] == ["0/0_0.geojson"]
+    for level in levels:
+        ids = set()
+        for path in level["tiles"]:
+            with open(tmp_path / maplayer.TILES_DIRNAME / path) as f:
+                ids.update(feature["id"] for feature in json.load(f)["features"])
+        assert ids == {"0", "1", "2"}
+    # each boundary is wider than the finest tiles so spans several
+    assert len(levels[-1]["tiles"]) > 3
+
+
+def test_map_layer_is_stale_when_source_changes(tmp_path):
+    filepath = tmp_path / "boundaries.gpkg"
+    filepath.write_bytes(b"boundaries")
+    map_layer = maplayer.MapLayer(
+        geojson="{}",
+        points=pd.DataFrame({"x": [0.0], "y": [0.0]}),
+        metadata=maplayer._get_metadata(
+            filepath, epsg="3857", levels=maplayer.LEVELS_OF_DETAIL
+        ),
+        tile_index={"origin": [0, 0], "levels": []},
+        tiles={},
+        geometries=np.empty(0, dtype=object),
+    )
+    maplayer.write_map_layer(map_layer, tmp_path / "layer")
+
+    assert maplayer.is_map_layer_current(filepath, tmp_path / "layer")
+    assert not maplayer.is_map_layer_current(filepath, tmp_path / "layer", epsg="2157")
+    filepath.write_bytes(b"new boundaries")
+    assert not maplayer.is_map_layer_current(filepath, tmp_path / "layer")
+
+
+def test_map_layer_query_resolves_a_lasso_polygon(tmp_path):
+    maplayer.write_map_layer(
+        maplayer.create_map_layer(_create_boundaries(), epsg="3857"), tmp_path
+    )
+    layer = maplayer.read_map_layer(tmp_path)
+    x = layer.points["x"].to_numpy()
+    y = layer.points["y"].to_numpy()
+    # covers the first centroid & reaches into the second boundary
+    lasso = Polygon(
+        [
+            (x[0] - 100, y[0] - 100),
+            (x[1] - 2000, y[0] - 100),
+            (x[1] - 2000, y[0] + 100),
+            (x[0] - 100, y[0] + 100),
+        ]
+    )
+
+    np.testing.assert_array_equal(layer.query(lasso, predicate="intersects"), [0, 1])
+    np.testing.assert_array_equal(layer.query(lasso, predicate="centroid"), [0])
+    with pytest.raises(ValueError):
+        layer.query(lasso, predicate="within")
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+from pandas.testing import assert_frame_equal
+import pytest
+
+from dea import _SRC_DIR
+from dea import io
+from dea import montecarlo
+from dea import retrofit
+
+
+@pytest.fixture
+def defaults():
+    with open(_SRC_DIR / "defaults.json") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def pre_retrofit(buildings):
+    return io._add_retrofit_columns(buildings.copy())
+
+
+def test_simulate_retrofits_matches_retrofit_buildings_if_all_selected(
+    pre_retrofit, defaults
+):
+    for properties in defaults.values():
+        properties["percentage_selected"] = 1
+
+    output = montecarlo.simulate_retrofits(
+        pre_retrofit, defaults, number_of_draws=3, max_workers=1
+    )
+
+    post_retrofit = retrofit.retrofit_buildings(pre_retrofit, defaults)
+    expected_bers = (
+        retrofit.calculate_ber_improvement(pre_retrofit, post_retrofit)
+        .query("category == 'Post'")
+        .set_index("energy_rating")["total"]
+    )
+    for draw in range(3):
+        bers = output.bers.loc[draw]
+        assert bers[bers > 0].to_dict() == expected_bers.to_dict()
+    # retrofit_buildings rounds each building's cost down to the euro
+    expected_costs = post_retrofit.costs.sum().sum() / 1e6
+    assert output.costs["total_cost_lower"].add(
+        output.costs["total_cost_upper"]
+    ).to_numpy() == pytest.approx(expected_costs, abs=1e-3)
+
+
+def test_simulate_retrofits_draws_vary(pre_retrofit, defaults):
+    for properties in defaults.values():
+        properties["percentage_selected"] = 0.5
+
+    output = montecarlo.simulate_retrofits(
+        pre_retrofit, defaults, number_of_draws=20, sample_costs=True, max_workers=1
+    )
+    assert output.bers.sum(axis=1).nunique() == 1
+    assert output.costs["total_cost"].nunique() > 1
+    percentiles = output.percentiles([0.05, 0.95])
+    assert (
+        percentiles["costs"].loc[0.05, "total_cost"]
+        <= percentiles["costs"].loc[0.95, "total_cost"]
+    )
+
+
+def test_simulate_retrofits_runs_in_process_on_concurrent_threads(
+    pre_retrofit, defaults
+):
+    walls = json.loads(json.dumps(defaults))
+    walls["wall"]["percentage_selected"] = 0.5
+    roofs = json.loads(json.dumps(defaults))
+    roofs["roof"]["percentage_selected"] = 1
+    expected_costs = [
+        montecarlo.simulate_retrofits(
+            pre_retrofit, selections, number_of_draws=4, max_workers=1
+        ).costs
+        for selections in [walls, roofs]
+    ]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        outputs = list(
+            executor.map(
+                lambda selections: montecarlo.simulate_retrofits(
+                    pre_retrofit, selections, number_of_draws=4, max_workers=1
+                ),
+                [walls, roofs] * 4,
+            )
+        )
+
+    for position, output in enumerate(outputs):
+        assert_frame_equal(output.costs, expected_costs[position % 2])
+    assert montecarlo._SIMULATION is None
+
+
+def test_simulate_retrofits_is_independent_of_workers(
+    pre_retrofit, defaults, monkeypatch
+):
+    # 2 draws of every building per chunk so the draws are split across workers
+    monkeypatch.setattr(montecarlo, "MAX_CHUNK_SIZE", 2 * len(pre_retrofit))
+    defaults["wall"]["percentage_selected"] = 0.5
+    defaults["roof"]["percentage_selected"] = 1
+
+    serial = montecarlo.simulate_retrofits(
+        pre_retrofit, defaults, number_of_draws=8, max_workers=1
+    )
+    parallel = montecarlo.simulate_retrofits(
+        pre_retrofit, defaults, number_of_draws=8, max_workers=2
+    )
+    assert serial.costs["total_cost_lower"].gt(0).all()
+    assert_frame_equal(serial.bers, parallel.bers)
+    assert_frame_equal(serial.costs, parallel.costs)
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_series_equal
+from rcbm import fab
+from rcbm import htuse
+
+from dea import filter
+from dea import retrofit
+
+
+def test_calculate_fabric_heat_loss_matches_rcbm(buildings):
+    buildings = buildings.copy()
+    buildings.loc[3, "wall_area"] = np.nan
+    expected_w_per_k = fab.calculate_fabric_heat_loss(
+        roof_area=buildings["roof_area"],
+        roof_uvalue=buildings["roof_uvalue"],
+        wall_area=buildings["wall_area"],
+        wall_uvalue=buildings["wall_uvalue"],
+        floor_area=buildings["floor_area"],
+        floor_uvalue=buildings["floor_uvalue"],
+        window_area=buildings["window_area"],
+        window_uvalue=buildings["window_uvalue"],
+        door_area=buildings["door_area"],
+        door_uvalue=buildings["door_uvalue"],
+        thermal_bridging_factor=0.05,
+    )
+    expected_kwh_per_y = htuse.calculate_heat_loss_per_year(expected_w_per_k)
+
+    output = retrofit.calculate_fabric_heat_loss(buildings)
+
+    assert_series_equal(
+        output["fabric_heat_loss_w_per_k"], expected_w_per_k, check_names=False
+    )
+    np.testing.assert_allclose(
+        output["fabric_heat_loss_kwh_per_y"], expected_kwh_per_y, atol=1
+    )
+
+
+def test_retrofit_buildings_matches_full_recalculation(buildings):
+    pre_retrofit = buildings.join(retrofit.calculate_fabric_heat_loss(buildings))
+    before = pre_retrofit.copy()
+    selections = {
+        "wall": {
+            "uvalue": {"target": 0.2, "threshold": 0.5},
+            "cost": {"lower": 50, "upper": 300},
+            "percentage_selected": 0.3,
+        },
+        "window": {
+            "uvalue": {"target": 0.2, "threshold": 0.5},
+            "cost": {"lower": 30, "upper": 150},
+            "percentage_selected": 0.6,
+        },
+    }
+
+    output = retrofit.retrofit_buildings(pre_retrofit, selections=selections)
+
+    post_retrofit = output.to_frame()
+    expected_output = retrofit.calculate_fabric_heat_loss(post_retrofit)
+    assert (post_retrofit["wall_uvalue"] != pre_retrofit["wall_uvalue"]).any()
+    assert list(output.uvalues) == ["wall", "window"]
+    np.testing.assert_allclose(
+        output.fabric_heat_loss_w_per_k, expected_output["fabric_heat_loss_w_per_k"]
+    )
+    np.testing.assert_allclose(
+        output.fabric_heat_loss_kwh_per_y,
+        expected_output["fabric_heat_loss_kwh_per_y"],
+        atol=1,
+    )
+    pd.testing.assert_frame_equal(pre_retrofit, before)
+
+
+def test_estimate_cost_of_fabric_retrofits():
+    output = retrofit._estimate_cost_of_fabric_retrofits(
+        is_selected=np.array([False, True, False, True]),
+        cost=100,
+        areas=np.array([100, 100, 100, np.nan]),
+    )
+    np.testing.assert_array_equal(output, [0, 10000, 0, 0])
+
+
+def test_get_viable_buildings_selects_a_reproducible_nested_subset():
+    uvalues = np.array([0.1, 0.6, 0.7, np.nan, 0.9, 0.3, 1.2, 0.8])
+
+    lower = retrofit._get_viable_buildings(uvalues, 0.5, percentage_selected=0.4)
+    upper = retrofit._get_viable_buildings(uvalues, 0.5, percentage_selected=0.8)
+
+    assert lower.sum() == 2
+    assert upper.sum() == 4
+    assert not (lower & (uvalues <= 0.5)).any()
+    assert (upper[lower]).all()
+    np.testing.assert_array_equal(
+        lower, retrofit._get_viable_buildings(uvalues, 0.5, percentage_selected=0.4)
+    )
+
+
+def test_get_viable_buildings_excludes_float32_uvalues_at_threshold():
+    uvalues = np.array([0.6, 0.6, 0.61, 0.59], dtype="float32")
+
+    is_viable = retrofit._get_viable_buildings(uvalues, 0.6, percentage_selected=1)
+
+    np.testing.assert_array_equal(is_viable, [False, False, True, False])
+
+
+def test_get_ber_codes_matches_pd_cut():
+    energy_values = np.array([-5, 0, 25, 25.01, 100, 224.9, 450, 451, np.nan, 1e4])
+    expected_output = pd.cut(
+        energy_values, retrofit.BER_BINS, labels=filter.BER_RATINGS
+    ).codes
+
+    output = retrofit.get_ber_codes(energy_values)
+
+    np.testing.assert_array_equal(output, expected_output)
+
+
+def test_calculate_ber_transitions_sum_to_pre_and_post_ratings(buildings):
+    pre_retrofit = buildings.join(retrofit.calculate_fabric_heat_loss(buildings))
+    pre_retrofit["total_floor_area"] = pre_retrofit.filter(like="floor_area").sum(
+        axis=1
+    )
+    selections = {
+        "wall": {
+            "uvalue": {"target": 0.2, "threshold": 0.5},
+            "cost": {"lower": 50, "upper": 300},
+            "percentage_selected": 0.8,
+        },
+    }
+    post_retrofit = retrofit.retrofit_buildings(pre_retrofit, selections=selections)
+
+    output = retrofit.calculate_ber_transitions(pre_retrofit, post_retrofit)
+
+    bers = retrofit.calculate_ber_improvement(pre_retrofit, post_retrofit)
+    for category, totals in [("Pre", output.sum(axis=1)), ("Post", output.sum())]:
+        expected_totals = bers.query("category == @category").set_index(
+            "energy_rating"
+        )["total"]
+        assert totals[totals > 0].to_dict() == expected_totals.to_dict()
+    # a retrofit never worsens a rating
+    assert np.triu(output.to_numpy(), k=1).sum() == 0
+    assert np.trace(output.to_numpy()) < output.to_numpy().sum()
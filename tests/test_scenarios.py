@@ -0,0 +1,148 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+
+import numpy as np
+import pandas as pd
+from pandas.testing import assert_frame_equal
+import pytest
+
+from dea import _SRC_DIR
+from dea import io
+from dea import retrofit
+from dea import scenarios
+
+
+@pytest.fixture
+def defaults():
+    with open(_SRC_DIR / "defaults.json") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def pre_retrofit(buildings):
+    return io._add_retrofit_columns(buildings.copy())
+
+
+def test_get_scenario_grid(defaults):
+    output = scenarios.get_scenario_grid(
+        defaults,
+        percentages_selected={"wall": [0, 0.5], "roof": [0.25, 1]},
+        target_uvalues={"window": [1.2, 1.4, 1.6]},
+    )
+    assert len(output) == 12
+    assert output[-1]["wall"]["percentage_selected"] == 0.5
+    assert output[-1]["roof"]["percentage_selected"] == 1
+    assert output[-1]["window"]["uvalue"]["target"] == 1.6
+    assert defaults["window"]["uvalue"]["target"] == 0.2
+
+
+def test_retrofit_scenarios_matches_retrofit_buildings(pre_retrofit, defaults):
+    grid = scenarios.get_scenario_grid(
+        defaults,
+        percentages_selected={
+            "wall": [0, 0.35, 1],
+            "roof": [0, 0.5],
+            "window": [0.2, 1],
+        },
+    )
+
+    output = scenarios.retrofit_scenarios(pre_retrofit, grid)
+
+    for scenario, selections in enumerate(grid):
+        post_retrofit = retrofit.retrofit_buildings(pre_retrofit, selections)
+        expected_bers = retrofit.calculate_ber_improvement(pre_retrofit, post_retrofit)
+        expected_heat_pumps = retrofit.calculate_heat_pump_viability_improvement(
+            pre_retrofit, post_retrofit
+        )
+        assert_frame_equal(
+            output.bers.query("scenario == @scenario")
+            .drop(columns="scenario")
+            .reset_index(drop=True),
+            expected_bers,
+            check_dtype=False,
+        )
+        assert_frame_equal(
+            output.heat_pumps.query("scenario == @scenario")
+            .drop(columns="scenario")
+            .reset_index(drop=True),
+            expected_heat_pumps,
+            check_dtype=False,
+        )
+        assert (
+            output.costs.loc[scenario].to_dict() == post_retrofit.costs.sum().to_dict()
+        )
+
+
+def test_retrofit_scenarios_selects_nested_buildings(pre_retrofit, defaults):
+    grid = scenarios.get_scenario_grid(
+        defaults, percentages_selected={"wall": [0.1, 0.4, 0.8]}
+    )
+
+    output = scenarios.retrofit_scenarios(pre_retrofit, grid)
+
+    wall_costs = output.costs["wall_cost_lower"].to_numpy()
+    assert np.all(np.diff(wall_costs) > 0)
+    post_retrofit_totals = (
+        output.bers.query("category == 'Post'").groupby("scenario")["total"].sum()
+    )
+    assert (post_retrofit_totals == pre_retrofit["energy_value"].notna().sum()).all()
+
+
+def test_retrofit_scenarios_does_not_depend_on_number_of_workers(
+    pre_retrofit, defaults, monkeypatch
+):
+    grid = scenarios.get_scenario_grid(
+        defaults, percentages_selected={"wall": [0.2, 0.6], "window": [0.5, 1]}
+    )
+    monkeypatch.setattr(scenarios, "MIN_SHARD_SIZE", 50)
+
+    expected_output = scenarios.retrofit_scenarios(pre_retrofit, grid, max_workers=1)
+    output = scenarios.retrofit_scenarios(pre_retrofit, grid, max_workers=3)
+
+    assert_frame_equal(output.bers, expected_output.bers)
+    assert_frame_equal(output.heat_pumps, expected_output.heat_pumps)
+    assert_frame_equal(output.costs, expected_output.costs)
+
+
+def test_get_shard_bounds_splits_between_small_areas():
+    small_areas = pd.Series(["a"] * 5 + ["b"] * 2 + ["c"] * 4 + ["d"] * 1)
+
+    bounds = scenarios._get_shard_bounds(small_areas, number_of_shards=3)
+
+    np.testing.assert_array_equal(bounds, [0, 5, 11, 12])
+
+
+def test_retrofit_scenarios_rejects_scenarios_of_different_components(
+    pre_retrofit, defaults
+):
+    walls = {"wall": defaults["wall"]}
+
+    with pytest.raises(ValueError, match="Scenario 1"):
+        scenarios.retrofit_scenarios(pre_retrofit, scenarios=[walls, defaults])
+
+
+def test_retrofit_scenarios_runs_in_process_on_concurrent_threads(
+    pre_retrofit, defaults
+):
+    grids = [
+        scenarios.get_scenario_grid(defaults, percentages_selected={"wall": [0.5]}),
+        scenarios.get_scenario_grid(defaults, percentages_selected={"roof": [1]}),
+    ]
+    expected_costs = [
+        scenarios.retrofit_scenarios(pre_retrofit, grid, max_workers=1).costs
+        for grid in grids
+    ]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        outputs = list(
+            executor.map(
+                lambda grid: scenarios.retrofit_scenarios(
+                    pre_retrofit, grid, max_workers=1
+                ),
+                grids * 4,
+            )
+        )
+
+    for position, output in enumerate(outputs):
+        assert_frame_equal(output.costs, expected_costs[position % 2])
+    assert scenarios._COLUMNS is None
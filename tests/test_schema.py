@@ -0,0 +1,58 @@
+import json
+
+import numpy as np
+from pandas.testing import assert_frame_equal
+import pytest
+
+from dea import _SRC_DIR
+from dea import io
+from dea import retrofit
+from dea import schema
+
+
+@pytest.fixture
+def selections():
+    with open(_SRC_DIR / "defaults.json") as f:
+        defaults = json.load(f)
+    for properties in defaults.values():
+        properties["percentage_selected"] = 0.5
+    return defaults
+
+
+def test_apply_schema_halves_memory(buildings):
+    buildings = buildings[schema.BUILDING_COLUMNS]
+    output = schema.apply_schema(buildings)
+    assert output.memory_usage(deep=True).sum() < (
+        buildings.memory_usage(deep=True).sum() / 2
+    )
+    assert output.dtypes.astype(str).to_dict() == schema.BUILDING_DTYPES
+
+
+def test_apply_schema_leaves_retrofit_results_unchanged(buildings, selections):
+    results = []
+    for buildings_with_dtypes in [buildings.copy(), schema.apply_schema(buildings)]:
+        pre_retrofit = io._add_retrofit_columns(buildings_with_dtypes)
+        post_retrofit = retrofit.retrofit_buildings(
+            buildings=pre_retrofit, selections=selections
+        )
+        results.append(
+            (
+                post_retrofit,
+                retrofit.calculate_ber_improvement(pre_retrofit, post_retrofit),
+                retrofit.calculate_heat_pump_viability_improvement(
+                    pre_retrofit, post_retrofit
+                ),
+            )
+        )
+    (post_retrofit64, bers64, hps64), (post_retrofit32, bers32, hps32) = results
+
+    np.testing.assert_allclose(
+        post_retrofit32.fabric_heat_loss_kwh_per_y,
+        post_retrofit64.fabric_heat_loss_kwh_per_y,
+        atol=1,
+    )
+    np.testing.assert_allclose(
+        post_retrofit32.costs.sum(), post_retrofit64.costs.sum(), rtol=1e-4
+    )
+    assert_frame_equal(bers32, bers64)
+    assert_frame_equal(hps32, hps64)
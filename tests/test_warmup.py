@@ -0,0 +1,102 @@
+import json
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from dea import DEFAULTS
+from dea import io
+from dea import jobs
+from dea import maplayer
+from dea import warmup
+
+
+def _write_map_layer(small_areas, boundaries_filepath, map_layer_dir):
+    # built from memory as reading a GeoPackage needs a working fiona
+    boundaries = gpd.GeoDataFrame(
+        {"small_area": small_areas},
+        geometry=[
+            box(715000 + 500 * i, 734000, 715400 + 500 * i, 734400)
+            for i in range(len(small_areas))
+        ],
+        crs="EPSG:2157",
+    )
+    metadata = maplayer._get_metadata(
+        boundaries_filepath, epsg="3857", levels=maplayer.LEVELS_OF_DETAIL
+    )
+    maplayer.write_map_layer(
+        maplayer.create_map_layer(boundaries, metadata=metadata), map_layer_dir
+    )
+
+
+def test_warm_up_caches_the_default_retrofit_and_signals_readiness(buildings, tmp_path):
+    io.load_buildings.clear()
+    data_dir, static_dir = tmp_path / "data", tmp_path / "static"
+    data_dir.mkdir()
+    buildings.to_parquet(data_dir / "bers.parquet")
+    (data_dir / "boundaries.gpkg").write_bytes(b"boundaries")
+    small_areas = sorted(buildings["small_area"].unique())
+    _write_map_layer(
+        small_areas, data_dir / "boundaries.gpkg", static_dir / "boundaries_map_layer"
+    )
+    readiness_filepath = data_dir / warmup.READINESS_FILENAME
+
+    durations = warmup.warm_up(
+        urls={
+            "bers": "s3://codema-dev/bers.parquet",
+            "small_area_boundaries": "s3://codema-dev/boundaries.gpkg",
+        },
+        data_dir=data_dir,
+        static_dir=static_dir,
+        readiness_filepath=readiness_filepath,
+    )
+
+    assert warmup.is_ready(readiness_filepath)
+    with open(readiness_filepath) as f:
+        assert json.load(f)["durations"] == durations
+    assert list(durations) == ["fetch", "map_layer", "buildings", "default_retrofit"]
+    # the app submits its defaults as floats & with the map's small areas
+    selections = json.loads(json.dumps(DEFAULTS))
+    for properties in selections.values():
+        properties["percentage_selected"] = 0.0
+    io.load_retrofit_summary(
+        url="s3://codema-dev/bers.parquet",
+        data_dir=data_dir,
+        selected_energy_ratings=["A", "B", "C", "D", "E", "F", "G"],
+        selected_small_areas=list(np.random.default_rng(0).permutation(small_areas)),
+        selections=selections,
+    )
+    assert len(list((data_dir / "results").iterdir())) == 1
+
+
+def test_start_warm_up_retries_a_failed_warm_up_off_the_job_manager(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(warmup, "_WARM_UP", None)
+    monkeypatch.setattr(
+        jobs, "get_job_manager", lambda: pytest.fail("took a job manager worker")
+    )
+    # as written by `python -m dea.warmup` before the app starts
+    readiness_filepath = tmp_path / warmup.READINESS_FILENAME
+    warmup._write_readiness_file(readiness_filepath, durations={})
+    calls = []
+
+    def _warm_up(data_dir, static_dir, readiness_filepath=None):
+        calls.append(readiness_filepath)
+        if len(calls) == 1:
+            raise OSError("no network")
+        return {}
+
+    monkeypatch.setattr(warmup, "warm_up", _warm_up)
+
+    failed = warmup.start_warm_up(data_dir=tmp_path, static_dir=tmp_path)
+    with pytest.raises(OSError):
+        failed.result(timeout=10)
+    retried = warmup.start_warm_up(data_dir=tmp_path, static_dir=tmp_path)
+    retried.result(timeout=10)
+
+    assert retried is not failed
+    assert warmup.start_warm_up(data_dir=tmp_path, static_dir=tmp_path) is retried
+    assert calls == [None, None]
+    assert warmup.is_ready(readiness_filepath)